@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+将导入脚本 --export 生成的向量文件(Parquet)加载到Qdrant集合，不需要加载模型。
+
+用法:
+  python bulk_load.py vectors.parquet --collection knowledge_base
+  python bulk_load.py exports/ --host staging-qdrant --port 6333
+  python bulk_load.py vectors.parquet --path ./qdrant_data      (本地模式)
+"""
+import os
+import argparse
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import PROFILES, collection_config
+from import_manifest import ImportManifest
+from payload_index import SAMPLE_SIZE, create_indexes, parse_fields, plan_indexes, sample_items
+
+def bulk_load(path, collection_name="knowledge_base", host="localhost", port=6333, local_path=None,
+              profile=None, batch_size=1024, full=False, index_fields=None, skip_index_fields=None, auto_indexes=True):
+    """流式加载向量文件到集合，上传之前按payload样本建立索引，返回上传的点数"""
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+        from sparse_encoder import has_sparse_vectors
+        from import_pipeline import ImportPipeline
+        from vector_export import export_files, iter_point_batches, read_export_metadata
+    
+    files = export_files(path)
+    if not files:
+        print(f"没有找到向量文件: {path}")
+        return 0
+    metadata = read_export_metadata(files[0])
+    for other in files[1:]:
+        other_metadata = read_export_metadata(other)
+        if (other_metadata["dimension"], other_metadata["vector_name"]) != (metadata["dimension"], metadata["vector_name"]):
+            raise ValueError(f"{other} 的向量维度或名称与 {files[0]} 不一致")
+    print(f"向量文件: {len(files)} 个, 维度 {metadata['dimension']}, 模型 {metadata.get('model', '未知')} "
+          f"(后端: {metadata.get('backend', '未知')})")
+
+    if local_path:
+        print(f"正在打开本地存储 {local_path}...")
+        client = QdrantClient(path=local_path)
+    else:
+        print(f"正在连接到 Qdrant ({host}:{port})...")
+        client = QdrantClient(host=host, port=port)
+
+    with startup_phase("连接Qdrant"):
+        collection_names = [collection.name for collection in client.get_collections().collections]
+    if collection_name not in collection_names:
+        print(f"正在创建集合 {collection_name}...")
+        client.create_collection(
+            collection_name=collection_name,
+            **collection_config(metadata["dimension"], profile, vector_name=metadata["vector_name"], sparse=metadata["sparse"])
+        )
+
+    # 文件和集合都有稀疏向量时才写入
+    with_sparse = metadata["sparse"] and has_sparse_vectors(client.get_collection(collection_name))
+
+    # 记录到增量导入清单，之后的增量导入可以跳过这些点
+    manifest = ImportManifest(collection_name, local_path or host, 0 if local_path else port)
+    manifest.sync_with_collection(client, collection_name)
+
+    pipeline = ImportPipeline(
+        None, client, collection_name,
+        vector_name=metadata["vector_name"],
+        with_sparse=with_sparse,
+        manifest=manifest,
+        skip_imported=not full
+    )
+    print_startup_timing()
+    try:
+        batches = iter_point_batches(files, batch_size, with_sparse)
+        if auto_indexes or index_fields:
+            sample, batches = sample_items(batches, max(1, SAMPLE_SIZE // batch_size))
+            plan = plan_indexes(
+                (payload for batch in sample for payload in batch.payloads), index_fields, skip_index_fields, auto_indexes
+            )
+            if plan:
+                create_indexes(client, collection_name, plan)
+        count = pipeline.load(batches)
+    finally:
+        manifest.close()
+        client.close()
+
+    print(f"成功加载了 {count} 条数据到 {collection_name} 集合")
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="将导出的向量文件加载到Qdrant (无需模型)")
+    parser.add_argument("path", type=str, help="向量文件(.parquet)或包含向量文件的目录")
+    parser.add_argument("--collection", type=str, default="knowledge_base", help="Qdrant集合名称")
+    parser.add_argument("--host", type=str, default="localhost", help="Qdrant服务器主机名")
+    parser.add_argument("--port", type=int, default=6333, help="Qdrant服务器端口")
+    parser.add_argument("--path", dest="local_path", type=str, help="使用本地存储目录(如 ./qdrant_data)而不是服务器")
+    parser.add_argument("--profile", type=str, choices=list(PROFILES),
+                        help="新建集合时使用的性能配置 (默认读取环境变量QDRANT_PROFILE)")
+    parser.add_argument("--batch_size", type=int, default=1024, help="每次从文件读取的点数")
+    parser.add_argument("--full", action="store_true", help="重新上传所有点，不跳过已导入的点")
+    parser.add_argument("--index_fields", type=str, help="总是建立payload索引的字段，逗号分隔，可指定类型(如 brand,year:integer)")
+    parser.add_argument("--skip_index_fields", type=str, help="不建立payload索引的字段，逗号分隔")
+    parser.add_argument("--no_auto_index", action="store_true", help="不按payload样本自动建立索引")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"文件不存在: {args.path}")
+        return
+
+    try:
+        index_fields = parse_fields(args.index_fields)
+        skip_index_fields = set(parse_fields(args.skip_index_fields))
+    except ValueError as e:
+        print(f"索引字段无效: {e}")
+        return
+
+    bulk_load(args.path, args.collection, args.host, args.port, args.local_path, args.profile, args.batch_size, args.full,
+              index_fields, skip_index_fields, not args.no_auto_index)
+
+if __name__ == "__main__":
+    main()
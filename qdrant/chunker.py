@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+长文档分块
+模型只编码前 MAX_SEQ_LENGTH 个token，超出部分会被静默截断。
+分块器按模型分词器的token数将长文本切分为相互重叠的窗口，
+每个窗口作为单独的点导入，payload中记录父文档ID(parent_id)和窗口序号。
+
+  - 窗口边界取自分词器的字符偏移，窗口文本是原文的子串
+  - 分词器不可用时按字符近似切分(中文按字，其他按词)
+  - 短文档保持为一个点，payload不变
+"""
+
+import re
+
+from embedding_backend import MAX_SEQ_LENGTH, MODEL_NAME
+from import_manifest import content_id
+from import_profile import profile_stage
+
+# 去掉 [CLS] / [SEP] 两个特殊token
+DEFAULT_MAX_TOKENS = MAX_SEQ_LENGTH - 2
+DEFAULT_OVERLAP = 32
+
+# 搜索时多取的候选倍数，同一父文档的多个窗口合并后仍能返回足够的结果
+CHUNK_FETCH_FACTOR = 3
+
+# 分词器不可用时的近似token
+APPROX_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]|[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+class TokenChunker:
+    """按token数切分文本为重叠窗口"""
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP, model_name=MODEL_NAME):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens 必须大于0")
+        if not 0 <= overlap < max_tokens:
+            raise ValueError("overlap 必须小于 max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.model_name = model_name
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+
+    @property
+    def tokenizer(self):
+        """首次使用时加载模型的快速分词器(需要字符偏移)，失败时返回None"""
+        if not self._tokenizer_loaded:
+            self._tokenizer_loaded = True
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{self.model_name}", use_fast=True)
+            except Exception as e:
+                print(f"无法加载分词器，按字符近似分块: {e}")
+        return self._tokenizer
+
+    def token_spans(self, text):
+        """每个token在原文中的 (起始, 结束) 字符偏移"""
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return [match.span() for match in APPROX_TOKEN_RE.finditer(text)]
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=False, verbose=False)
+        return [(start, end) for start, end in encoded["offset_mapping"] if end > start]
+
+    def count_tokens(self, text):
+        return len(self.token_spans(text))
+
+    def split(self, text, reserved_tokens=0):
+        """切分为窗口，reserved_tokens 为每个窗口前缀(如标题)占用的token数"""
+        size = max(1, self.max_tokens - reserved_tokens)
+        spans = self.token_spans(text)
+        if len(spans) <= size:
+            return [text]
+
+        step = max(1, size - self.overlap)
+        windows = []
+        start = 0
+        while True:
+            end = min(start + size, len(spans))
+            windows.append(text[spans[start][0]:spans[end - 1][1]])
+            if end == len(spans):
+                return windows
+            start += step
+
+
+def split_document(text, payload, chunker, text_field="text", prefix=""):
+    """
+    将一个文档切分为 (编码文本, payload) 序列。
+    长文档的每个窗口以 prefix + 窗口文本 编码，payload[text_field] 替换为窗口文本，
+    并记录 parent_id / chunk_index / chunk_count
+    """
+    with profile_stage("chunk", 1):
+        windows = chunker.split(text, chunker.count_tokens(prefix) if prefix else 0)
+    if len(windows) == 1:
+        yield prefix + text, payload
+        return
+
+    parent_id = content_id(prefix + text, payload)
+    for index, window in enumerate(windows):
+        chunk_payload = dict(payload, parent_id=parent_id, chunk_index=index, chunk_count=len(windows))
+        if text_field:
+            chunk_payload[text_field] = window
+        yield prefix + window, chunk_payload
+
+
+def chunk_items(items, chunker, text_field="text"):
+    """对流水线输入的 (text, payload) 逐个分块"""
+    for text, payload in items:
+        yield from split_document(text, payload, chunker, text_field)
+
+
+def collapse_chunks(points, limit):
+    """同一父文档只保留得分最高的窗口(结果已按得分降序)"""
+    seen = set()
+    results = []
+    for point in points:
+        parent = (point.payload or {}).get("parent_id", point.id)
+        if parent in seen:
+            continue
+        seen.add(parent)
+        results.append(point)
+        if len(results) >= limit:
+            break
+    return results
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+集合性能配置
+定义命名的集合性能配置(量化、向量落盘、HNSW参数)，
+在所有创建集合和搜索的地方统一使用。
+
+通过环境变量 QDRANT_PROFILE 或命令行参数 --profile 选择配置。
+命令行工具在解析参数时就需要 PROFILES，qdrant_client 在生成配置时才导入。
+"""
+
+import os
+
+DEFAULT_PROFILE = "default"
+
+# 各配置项:
+#   hnsw_m / hnsw_ef_construct: HNSW建图参数
+#   hnsw_ef: 搜索时的ef
+#   quantization: 是否启用int8标量量化(量化向量常驻内存)
+#   rescore / oversampling: 量化搜索时用原始向量重新打分及过采样倍数
+#   on_disk: 原始向量存放在磁盘上
+#   on_disk_payload: payload存放在磁盘上
+PROFILES = {
+    # 与Qdrant默认设置一致
+    "default": {},
+    # 低延迟: int8量化 + 重新打分，原始向量仍在内存中
+    "fast": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "hnsw_ef": 64,
+        "quantization": True,
+        "rescore": True,
+        "oversampling": 2.0,
+    },
+    # 低内存: 原始向量和payload落盘，仅量化向量常驻内存
+    "low_memory": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "hnsw_ef": 128,
+        "quantization": True,
+        "rescore": True,
+        "oversampling": 2.0,
+        "on_disk": True,
+        "on_disk_payload": True,
+    },
+    # 高召回: 更密的图与更大的搜索ef，不量化
+    "high_recall": {
+        "hnsw_m": 32,
+        "hnsw_ef_construct": 256,
+        "hnsw_ef": 256,
+    },
+}
+
+
+def get_profile(name=None):
+    """按名称获取配置，未指定时读取环境变量 QDRANT_PROFILE"""
+    name = name or os.getenv("QDRANT_PROFILE", DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise ValueError(f"未知的集合配置: {name}，可选: {', '.join(PROFILES)}")
+    return dict(PROFILES[name], name=name)
+
+
+def collection_config(vector_size, profile=None, vector_name=None, sparse=False):
+    """返回 create_collection 的参数(不含集合名称)，sparse=True 时同时配置BM25稀疏向量"""
+    from qdrant_client.http.models import (
+        Distance,
+        HnswConfigDiff,
+        ScalarQuantization,
+        ScalarQuantizationConfig,
+        ScalarType,
+        VectorParams,
+    )
+    from sparse_encoder import sparse_vectors_config
+
+    profile = profile if isinstance(profile, dict) else get_profile(profile)
+
+    vector_params = VectorParams(
+        size=vector_size,
+        distance=Distance.COSINE,
+        on_disk=profile.get("on_disk")
+    )
+    config = {
+        "vectors_config": {vector_name: vector_params} if vector_name else vector_params
+    }
+
+    if "hnsw_m" in profile or "hnsw_ef_construct" in profile:
+        config["hnsw_config"] = HnswConfigDiff(
+            m=profile.get("hnsw_m"),
+            ef_construct=profile.get("hnsw_ef_construct")
+        )
+
+    if profile.get("quantization"):
+        config["quantization_config"] = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+
+    if profile.get("on_disk_payload"):
+        config["on_disk_payload"] = True
+
+    if sparse:
+        config["sparse_vectors_config"] = sparse_vectors_config()
+
+    return config
+
+
+def search_params(profile=None):
+    """返回搜索时使用的 SearchParams，默认配置返回None"""
+    from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+
+    profile = profile if isinstance(profile, dict) else get_profile(profile)
+
+    quantization = None
+    if profile.get("quantization"):
+        quantization = QuantizationSearchParams(
+            rescore=profile.get("rescore", True),
+            oversampling=profile.get("oversampling")
+        )
+
+    if profile.get("hnsw_ef") is None and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=profile.get("hnsw_ef"), quantization=quantization)
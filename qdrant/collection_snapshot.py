@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+集合快照与恢复
+不重新编码，直接把集合中的点(ID、向量、payload、稀疏向量)分页导出到压缩的快照文件，
+再并发上传恢复，几分钟内即可重建环境。Docker中的Qdrant服务器和本地存储(--path ./qdrant_data)都可以使用。
+
+快照文件与 --export 的向量文件格式相同(Parquet，见 vector_export.py)，
+额外记录集合配置(向量参数、HNSW、量化、稀疏向量)和payload索引，恢复时按原配置建立集合；
+快照文件也可以用 bulk_load.py 加载到其他配置的集合。
+
+用法:
+  python collection_snapshot.py snapshot --collection knowledge_base --output snapshots/kb.parquet
+  python collection_snapshot.py restore snapshots/kb.parquet --path ./qdrant_data
+  python collection_snapshot.py restore snapshots/kb.parquet --collection kb_copy --recreate
+"""
+import os
+import json
+import queue
+import argparse
+import threading
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import collection_config
+
+# 每次滚动读取的点数
+PAGE_SIZE = 1024
+
+def connect(host="localhost", port=6333, local_path=None):
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+    if local_path:
+        print(f"正在打开本地存储 {local_path}...")
+        return QdrantClient(path=local_path)
+    print(f"正在连接到 Qdrant ({host}:{port})...")
+    return QdrantClient(host=host, port=port)
+
+def dense_vector_params(config):
+    """集合的稠密向量参数，返回 (向量名称或None, VectorParams)；只支持单个稠密向量"""
+    from qdrant_client.http.models import VectorParams
+    vectors = config.params.vectors
+    if isinstance(vectors, VectorParams):
+        return None, vectors
+    if len(vectors) != 1:
+        raise ValueError(f"快照只支持一个稠密向量的集合，该集合有: {', '.join(vectors)}")
+    name, params = next(iter(vectors.items()))
+    return name or None, params
+
+def restore_config(config):
+    """由快照中的集合配置生成 create_collection 的参数"""
+    from qdrant_client.http.models import HnswConfigDiff
+    kwargs = {
+        "vectors_config": config.params.vectors,
+        "on_disk_payload": config.params.on_disk_payload,
+    }
+    if config.params.sparse_vectors:
+        kwargs["sparse_vectors_config"] = config.params.sparse_vectors
+    if config.hnsw_config is not None:
+        kwargs["hnsw_config"] = HnswConfigDiff(**config.hnsw_config.model_dump())
+    if config.quantization_config is not None:
+        kwargs["quantization_config"] = config.quantization_config
+    return kwargs
+
+def _scroll_pages(client, collection_name, page_size, pages, stop):
+    """在后台线程中滚动读取，与写入快照重叠进行"""
+    offset = None
+    try:
+        while not stop.is_set():
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                pages.put(points)
+            if offset is None:
+                break
+    except BaseException as e:
+        pages.put(e)
+        return
+    pages.put(None)
+
+def to_point_batch(points, vector_name, with_sparse):
+    """将滚动得到的点转换为 PointBatch"""
+    import numpy as np
+    from qdrant_client.http.models import SparseVector
+    from sparse_encoder import SPARSE_VECTOR_NAME
+    from import_pipeline import PointBatch
+    dense = []
+    sparse = [] if with_sparse else None
+    for point in points:
+        vector = point.vector
+        if isinstance(vector, dict):
+            dense.append(vector[vector_name or ""])
+            if with_sparse:
+                sparse.append(vector.get(SPARSE_VECTOR_NAME) or SparseVector(indices=[], values=[]))
+        else:
+            dense.append(vector)
+            if with_sparse:
+                sparse.append(SparseVector(indices=[], values=[]))
+    return PointBatch(
+        [point.id for point in points],
+        np.asarray(dense, dtype=np.float32),
+        [point.payload or {} for point in points],
+        sparse
+    )
+
+def snapshot(client, collection_name, output, page_size=PAGE_SIZE):
+    """将集合的所有点分页写入快照文件，返回写入的点数"""
+    with startup_phase("导入模块"):
+        from tqdm import tqdm
+        from sparse_encoder import has_sparse_vectors
+        from vector_export import ParquetExporter
+    with startup_phase("连接Qdrant"):
+        info = client.get_collection(collection_name)
+    print_startup_timing()
+    vector_name, params = dense_vector_params(info.config)
+    with_sparse = has_sparse_vectors(info)
+    payload_schema = {name: schema.data_type.value for name, schema in (info.payload_schema or {}).items()}
+
+    exporter = ParquetExporter(
+        output, params.size, vector_name=vector_name, with_sparse=with_sparse,
+        extra_metadata={
+            "collection": collection_name,
+            "collection_config": info.config.model_dump_json(),
+            "payload_schema": json.dumps(payload_schema),
+        }
+    )
+    total = client.count(collection_name=collection_name, exact=True).count
+    pages = queue.Queue(maxsize=4)
+    stop = threading.Event()
+    reader = threading.Thread(target=_scroll_pages, args=(client, collection_name, page_size, pages, stop), daemon=True)
+    reader.start()
+
+    count = 0
+    try:
+        with tqdm(total=total, desc="快照", unit="point") as progress:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, BaseException):
+                    raise page
+                exporter.write_batch(to_point_batch(page, vector_name, with_sparse))
+                count += len(page)
+                progress.update(len(page))
+    except BaseException:
+        stop.set()
+        exporter.abort()
+        raise
+    exporter.close()
+    print(f"已将集合 {collection_name} 的 {count} 个点写入快照 {output} ({os.path.getsize(output) / 2**20:.1f} MiB)")
+    return count
+
+def restore(client, path, collection_name=None, recreate=False, concurrency=None, batch_size=PAGE_SIZE):
+    """按快照中的配置建立集合并并发上传所有点，返回恢复的点数；concurrency 默认为 IMPORT_UPSERT_CONCURRENCY"""
+    with startup_phase("导入模块"):
+        from qdrant_client.http.models import CollectionConfig, PayloadSchemaType
+        from sparse_encoder import has_sparse_vectors
+        from import_pipeline import UPSERT_CONCURRENCY, ImportPipeline
+        from vector_export import iter_point_batches, read_export_metadata
+
+    metadata = read_export_metadata(path)
+    collection_name = collection_name or metadata.get("collection")
+    if not collection_name:
+        raise ValueError(f"{path} 中没有记录集合名称，请用 --collection 指定")
+
+    with startup_phase("连接Qdrant"):
+        exists = collection_name in [collection.name for collection in client.get_collections().collections]
+    print_startup_timing()
+    if exists and recreate:
+        print(f"正在删除集合 {collection_name}...")
+        client.delete_collection(collection_name)
+        exists = False
+    if exists and client.count(collection_name=collection_name, exact=True).count:
+        raise ValueError(f"集合 {collection_name} 已存在且不为空，使用 --recreate 重建")
+
+    if not exists:
+        print(f"正在创建集合 {collection_name}...")
+        if metadata.get("collection_config"):
+            config = restore_config(CollectionConfig.model_validate_json(metadata["collection_config"]))
+        else:
+            # --export 生成的向量文件没有集合配置，使用默认配置
+            config = collection_config(metadata["dimension"], vector_name=metadata["vector_name"], sparse=metadata["sparse"])
+        client.create_collection(collection_name=collection_name, **config)
+
+    # 先建立payload索引，上传的点直接写入索引
+    for field, data_type in json.loads(metadata.get("payload_schema") or "{}").items():
+        client.create_payload_index(
+            collection_name=collection_name, field_name=field, field_schema=PayloadSchemaType(data_type), wait=True
+        )
+
+    with_sparse = metadata["sparse"] and has_sparse_vectors(client.get_collection(collection_name))
+    pipeline = ImportPipeline(
+        None, client, collection_name,
+        vector_name=metadata["vector_name"],
+        with_sparse=with_sparse,
+        upsert_batch_size=batch_size,
+        upsert_concurrency=concurrency or UPSERT_CONCURRENCY
+    )
+    count = pipeline.load(iter_point_batches([path], batch_size, with_sparse), desc="恢复")
+
+    stored = client.count(collection_name=collection_name, exact=True).count
+    if stored != count:
+        print(f"警告: 集合中有 {stored} 个点，快照中有 {count} 个点")
+    print(f"已从快照恢复集合 {collection_name}: {count} 个点")
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant集合快照与恢复 (不需要模型)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="将集合写入快照文件")
+    snapshot_parser.add_argument("--collection", type=str, default="knowledge_base", help="Qdrant集合名称")
+    snapshot_parser.add_argument("--output", type=str, help="快照文件路径 (默认 snapshots/<集合>.parquet)")
+    snapshot_parser.add_argument("--page_size", type=int, default=PAGE_SIZE, help="每次滚动读取的点数")
+
+    restore_parser = subparsers.add_parser("restore", help="从快照文件恢复集合")
+    restore_parser.add_argument("snapshot", type=str, help="快照文件路径")
+    restore_parser.add_argument("--collection", type=str, help="恢复到的集合名称 (默认为快照中的集合)")
+    restore_parser.add_argument("--recreate", action="store_true", help="集合已存在时先删除")
+    restore_parser.add_argument("--concurrency", type=int, help="同时在途的上传请求数 (默认读取环境变量IMPORT_UPSERT_CONCURRENCY)")
+    restore_parser.add_argument("--batch_size", type=int, default=PAGE_SIZE, help="每次从快照读取的点数")
+
+    for subparser in (snapshot_parser, restore_parser):
+        subparser.add_argument("--host", type=str, default="localhost", help="Qdrant服务器主机名")
+        subparser.add_argument("--port", type=int, default=6333, help="Qdrant服务器端口")
+        subparser.add_argument("--path", dest="local_path", type=str, help="使用本地存储目录(如 ./qdrant_data)而不是服务器")
+
+    args = parser.parse_args()
+
+    if args.command == "restore" and not os.path.exists(args.snapshot):
+        print(f"文件不存在: {args.snapshot}")
+        return
+
+    client = connect(args.host, args.port, args.local_path)
+    try:
+        if args.command == "snapshot":
+            output = args.output or os.path.join("snapshots", f"{args.collection}.parquet")
+            snapshot(client, args.collection, output, args.page_size)
+        else:
+            restore(client, args.snapshot, args.collection, args.recreate, args.concurrency, args.batch_size)
+    except ValueError as e:
+        print(f"错误: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+异步嵌入微批处理器
+将并发请求中的文本在短时间窗口内合并，批量调用 SentenceTransformer.encode，
+并在工作线程中执行推理，避免阻塞事件循环。
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EmbeddingBatcher:
+    """合并并发的编码请求，按批次调用模型"""
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = None
+        self._worker = None
+        # 模型推理放在单独线程中，保证同一时刻只有一个批次在运行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+        # 指标
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._batch_size_hist = {}
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._encode_total = 0.0
+
+    async def start(self):
+        """启动后台批处理任务"""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台批处理任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    async def encode(self, text):
+        """提交一条文本，等待其所在批次完成后返回向量"""
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def encode_many(self, texts):
+        """提交多条文本，按输入顺序返回向量"""
+        return await asyncio.gather(*(self.encode(text) for text in texts))
+
+    async def _collect(self):
+        """收集一个批次: 达到最大批次大小或等待窗口结束即返回"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # 窗口已结束，但仍然带上已在队列中的请求
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # 跳过已被取消的请求
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            texts = [item[0] for item in batch]
+            started = time.perf_counter()
+            self._record_wait(batch, started)
+
+            try:
+                vectors = await loop.run_in_executor(
+                    self._executor,
+                    lambda: self.model.encode(texts, batch_size=len(texts))
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._record_batch(len(texts), time.perf_counter() - started)
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def _record_wait(self, batch, now):
+        for _, _, enqueued in batch:
+            waited = now - enqueued
+            self._waited += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def _record_batch(self, size, encode_seconds):
+        self._batches += 1
+        self._items += size
+        self._max_batch_seen = max(self._max_batch_seen, size)
+        self._batch_size_hist[size] = self._batch_size_hist.get(size, 0) + 1
+        self._encode_total += encode_seconds
+
+    def metrics(self):
+        """返回批次大小与排队等待时间指标"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "max_batch_size_seen": self._max_batch_seen,
+            "batch_size_histogram": dict(sorted(self._batch_size_hist.items())),
+            "avg_queue_wait_ms": self._wait_total / self._waited * 1000.0 if self._waited else 0.0,
+            "max_queue_wait_ms": self._wait_max * 1000.0,
+            "avg_encode_ms": self._encode_total / self._batches * 1000.0 if self._batches else 0.0,
+        }
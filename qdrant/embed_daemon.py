@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+常驻嵌入守护进程
+搜索命令每次运行都要加载SentenceTransformer(和torch)，耗时数秒，而一次查询的编码只需几毫秒。
+守护进程在Unix socket上保持模型常驻，合并并发请求批量编码(EmbeddingBatcher)，外层使用磁盘嵌入缓存；
+qdrant_kb.py search 和 search_qdrant.py 发现守护进程时通过socket编码，否则在本进程加载模型。
+
+使用方法:
+  - 启动: python embed_daemon.py start [--backend onnx] [--idle_timeout 3600] &
+  - 状态: python embed_daemon.py status
+  - 停止: python embed_daemon.py stop
+
+协议: 每条消息为 4字节长度(大端) + JSON；encode 的响应之后紧跟 float32 向量的原始字节。
+客户端只依赖标准库和numpy，不导入torch。
+
+环境变量:
+  EMBED_DAEMON          搜索命令是否使用守护进程 (默认 true)
+  EMBED_DAEMON_SOCKET   socket路径 (默认 ~/.cache/qdrant-embeddings/embed.sock)
+  EMBED_DAEMON_TIMEOUT  单次编码请求的超时(秒，默认 30)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+
+from embedding_backend import BACKENDS, MODEL_NAME, get_backend
+
+DAEMON_ENABLED = os.getenv("EMBED_DAEMON", "true").lower() in ("1", "true", "yes")
+SOCKET_PATH = os.getenv("EMBED_DAEMON_SOCKET", os.path.join(os.path.expanduser("~"), ".cache", "qdrant-embeddings", "embed.sock"))
+REQUEST_TIMEOUT = float(os.getenv("EMBED_DAEMON_TIMEOUT", "30"))
+
+# 连接守护进程的超时，守护进程不存在时尽快回退
+CONNECT_TIMEOUT = 0.5
+
+_HEADER = struct.Struct(">I")
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("嵌入守护进程关闭了连接")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send_message(sock, message):
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_message(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class DaemonEncoder:
+    """通过Unix socket调用守护进程编码；接口与SentenceTransformer一致"""
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=REQUEST_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            self._sock.connect(socket_path)
+            self._sock.settimeout(timeout)
+            self.info = self.request({"op": "info"})
+        except BaseException:
+            self._sock.close()
+            raise
+
+    def request(self, message):
+        _send_message(self._sock, message)
+        response = _recv_message(self._sock)
+        if not response.get("ok"):
+            raise RuntimeError(f"嵌入守护进程出错: {response.get('error')}")
+        return response
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """单条输入返回一维向量，列表输入返回二维数组(float32)"""
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        response = self.request({"op": "encode", "texts": texts})
+        rows, dimension = response["shape"]
+        vectors = np.frombuffer(_recv_exact(self._sock, rows * dimension * 4), dtype=np.float32).reshape(rows, dimension)
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.info["dimension"]
+
+    def close(self):
+        self._sock.close()
+
+
+def connect_daemon(model_name=MODEL_NAME, backend=None, socket_path=SOCKET_PATH):
+    """连接正在运行且模型与后端一致的守护进程，不可用时返回None"""
+    if not DAEMON_ENABLED or not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        encoder = DaemonEncoder(socket_path)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    if (encoder.info.get("model"), encoder.info.get("backend")) != (model_name, get_backend(backend)):
+        print(f"嵌入守护进程的模型为 {encoder.info.get('model')} (后端: {encoder.info.get('backend')})，与当前配置不一致，不使用")
+        encoder.close()
+        return None
+    return encoder
+
+
+def load_encoder(backend=None, model_name=MODEL_NAME):
+    """优先使用常驻的守护进程，否则在本进程加载模型(外层使用磁盘嵌入缓存)"""
+    backend = get_backend(backend)
+    encoder = connect_daemon(model_name, backend)
+    if encoder is not None:
+        print(f"使用嵌入守护进程 {encoder.socket_path} (进程 {encoder.info['pid']})")
+        return encoder
+    from embedding_backend import load_model
+    from embedding_cache import cached_encoder
+    return cached_encoder(load_model(backend, model_name), model_name, backend)
+
+
+class EmbeddingDaemon:
+    """在Unix socket上提供批量编码服务"""
+
+    def __init__(self, socket_path=SOCKET_PATH, backend=None, model_name=MODEL_NAME, idle_timeout=0.0):
+        self.socket_path = socket_path
+        self.backend = get_backend(backend)
+        self.model_name = model_name
+        self.idle_timeout = idle_timeout
+        self.requests = 0
+        self.texts = 0
+        self.started = time.time()
+        self._last_request = time.monotonic()
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        from embed_batcher import EmbeddingBatcher
+        from embedding_backend import load_model
+        from embedding_cache import cached_encoder
+
+        print(f"正在加载嵌入模型: {self.model_name} (后端: {self.backend})...")
+        model = cached_encoder(load_model(self.backend, self.model_name), self.model_name, self.backend)
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.batcher = EmbeddingBatcher(
+            model,
+            max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")),
+            max_wait_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+        )
+        await self.batcher.start()
+        # 预热，首个请求不承担冷启动开销
+        await self.batcher.encode("warm up")
+
+        self._stopped = asyncio.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        # 只允许当前用户连接: socket文件创建时权限即为0600，不存在其他用户可以连接的窗口
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        print(f"嵌入守护进程已就绪: {self.socket_path} (进程 {os.getpid()})")
+
+        watchdog = asyncio.create_task(self._watch_idle()) if self.idle_timeout > 0 else None
+        try:
+            await self._stopped.wait()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            server.close()
+            await server.wait_closed()
+            await self.batcher.stop()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            print("嵌入守护进程已停止")
+
+    async def _watch_idle(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 10.0))
+            if time.monotonic() - self._last_request > self.idle_timeout:
+                print(f"空闲超过 {self.idle_timeout:.0f} 秒，退出")
+                self._stopped.set()
+                return
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    message = await reader.readexactly(size)
+                except asyncio.IncompleteReadError:
+                    break
+                self._last_request = time.monotonic()
+                self.requests += 1
+                body = b""
+                try:
+                    request = json.loads(message)
+                    if not isinstance(request, dict):
+                        raise ValueError("请求必须是JSON对象")
+                except ValueError as e:
+                    # 长度前缀完整，连接仍可继续使用
+                    response = {"ok": False, "error": f"无效的请求: {e}"}
+                else:
+                    try:
+                        response, body = await self._dispatch(request)
+                    except Exception as e:
+                        response = {"ok": False, "error": str(e)}
+                data = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(_HEADER.pack(len(data)) + data + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # 客户端断开，或守护进程停止时取消仍打开的连接
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        import numpy as np
+
+        op = request.get("op")
+        if op == "encode":
+            texts = request["texts"]
+            self.texts += len(texts)
+            if texts:
+                vectors = np.ascontiguousarray(await self.batcher.encode_many(texts), dtype=np.float32)
+            else:
+                vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            return {"ok": True, "shape": list(vectors.shape)}, vectors.tobytes()
+        if op == "info":
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "model": self.model_name,
+                "backend": self.backend,
+                "dimension": self.dimension,
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "requests": self.requests,
+                "texts": self.texts,
+                "batcher": self.batcher.metrics(),
+            }, b""
+        if op == "stop":
+            self._stopped.set()
+            return {"ok": True}, b""
+        raise ValueError(f"未知的操作: {op}")
+
+
+def socket_in_use(socket_path):
+    """socket文件存在且有进程在监听"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻嵌入守护进程 (Unix socket)")
+    parser.add_argument("command", choices=["start", "status", "stop"], help="启动(前台运行)、查看状态或停止")
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH, help="socket路径 (默认读取环境变量EMBED_DAEMON_SOCKET)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, help="嵌入模型后端 (默认读取环境变量EMBED_BACKEND)")
+    parser.add_argument("--idle_timeout", type=float, default=0.0, help="空闲多少秒后自动退出，0为不退出")
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("当前平台不支持Unix socket")
+        sys.exit(1)
+
+    if args.command == "start":
+        if os.path.exists(args.socket):
+            if socket_in_use(args.socket):
+                print(f"嵌入守护进程已在运行: {args.socket}")
+                sys.exit(1)
+            # 上次异常退出留下的socket文件
+            os.remove(args.socket)
+        try:
+            EmbeddingDaemon(args.socket, args.backend, idle_timeout=args.idle_timeout).run()
+        except KeyboardInterrupt:
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+        return
+
+    try:
+        encoder = DaemonEncoder(args.socket)
+    except OSError:
+        print(f"嵌入守护进程未运行: {args.socket}")
+        sys.exit(1)
+    try:
+        if args.command == "status":
+            print(json.dumps(encoder.info, ensure_ascii=False, indent=2))
+        else:
+            encoder.request({"op": "stop"})
+            print(f"已停止嵌入守护进程 (进程 {encoder.info['pid']})")
+    finally:
+        encoder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+多进程嵌入池
+每个工作进程加载一份模型，一个批次拆分给各进程并行编码后按原顺序合并。
+接口与SentenceTransformer一致(encode / get_sentence_embedding_dimension)，
+可以直接替换导入流水线中的模型。
+"""
+
+import os
+import time
+import multiprocessing
+
+from embedding_backend import MODEL_NAME, get_backend, load_model
+
+# 工作进程内的模型
+_worker_model = None
+
+
+def _init_worker(backend, model_name, num_threads):
+    """工作进程初始化: 限制推理线程数并加载模型"""
+    global _worker_model
+    os.environ["EMBED_NUM_THREADS"] = str(num_threads)
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(num_threads)
+    _worker_model = load_model(backend, model_name)
+
+
+def _encode_chunk(texts):
+    started = time.perf_counter()
+    vectors = _worker_model.encode(texts, batch_size=len(texts))
+    return os.getpid(), vectors, time.perf_counter() - started
+
+
+def _dimension(_):
+    return _worker_model.get_sentence_embedding_dimension()
+
+
+def create_encoder(backend=None, workers=1, model_name=MODEL_NAME):
+    """workers > 1 时返回多进程嵌入池，否则在当前进程加载模型"""
+    if workers and workers > 1:
+        return ProcessEmbeddingPool(workers, backend, model_name)
+    return load_model(backend, model_name)
+
+
+class ProcessEmbeddingPool:
+    """在多个进程中并行编码，输出顺序与输入一致"""
+
+    def __init__(self, workers, backend=None, model_name=MODEL_NAME, min_chunk_size=8):
+        self.workers = workers
+        self.min_chunk_size = min_chunk_size
+        backend = get_backend(backend)
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+        print(f"正在启动 {workers} 个嵌入进程 (每个进程 {num_threads} 个推理线程)...")
+        # 使用spawn，避免fork已初始化线程池的推理库
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(backend, model_name, num_threads)
+        )
+        self._dimension = None
+        # pid -> [文档数, 编码耗时]
+        self._worker_stats = {}
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """拆分到各进程编码，单条输入返回一维向量，列表输入返回二维数组"""
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        chunk_size = max(self.min_chunk_size, -(-len(sentences) // self.workers))
+        chunks = [sentences[i:i + chunk_size] for i in range(0, len(sentences), chunk_size)]
+
+        outputs = []
+        # map保持输入顺序
+        for pid, vectors, seconds in self._pool.map(_encode_chunk, chunks):
+            stats = self._worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += len(vectors)
+            stats[1] += seconds
+            outputs.append(np.asarray(vectors, dtype=np.float32))
+
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self):
+        if self._dimension is None:
+            self._dimension = self._pool.apply(_dimension, (None,))
+        return self._dimension
+
+    def stats(self):
+        """每个工作进程的文档数与编码速度"""
+        return {
+            pid: {
+                "docs": docs,
+                "encode_seconds": seconds,
+                "docs_per_sec": docs / seconds if seconds > 0 else 0.0,
+            }
+            for pid, (docs, seconds) in sorted(self._worker_stats.items())
+        }
+
+    def print_stats(self):
+        total_docs = 0
+        for pid, stats in self.stats().items():
+            total_docs += stats["docs"]
+            print(f"  嵌入进程 {pid}: {stats['docs']} 条, {stats['docs_per_sec']:.1f} 条/秒")
+        print(f"  合计: {total_docs} 条 ({self.workers} 个进程)")
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+可选的嵌入模型后端
+  - torch:     SentenceTransformer (PyTorch, 默认)
+  - onnx:      导出为ONNX后用onnxruntime推理
+  - onnx-int8: 在onnx基础上做动态int8量化
+
+通过环境变量 EMBED_BACKEND 或命令行参数 --backend 选择。
+ONNX模型首次使用时导出到 EMBED_ONNX_DIR (默认 ~/.cache/qdrant-embeddings/onnx)，
+导出后与PyTorch输出比较余弦相似度，超出容差则拒绝使用。
+
+使用方法:
+  - 导出并校验: python embedding_backend.py export --backend onnx-int8
+"""
+
+import os
+import inspect
+import argparse
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+MAX_SEQ_LENGTH = 128
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+DEFAULT_BACKEND = "torch"
+
+ONNX_DIR = os.getenv("EMBED_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "qdrant-embeddings", "onnx"))
+
+# 与PyTorch输出的最小余弦相似度
+COSINE_TOLERANCE = {
+    "onnx": 0.9999,
+    "onnx-int8": 0.98,
+}
+
+# 用于校验的样例句子(中英文混合)
+VERIFY_SENTENCES = [
+    "比亚迪秦Plus DM-i是一款插电式混合动力汽车，百公里油耗仅为3.8L",
+    "向量数据库如Qdrant专门为高效存储和检索向量嵌入而设计",
+    "BYD Song PLUS compact SUV with PHEV and EV powertrains",
+    "Docker的优势是什么",
+    "适合家庭的七座SUV",
+]
+
+
+def get_backend(name=None):
+    """按名称获取后端，未指定时读取环境变量 EMBED_BACKEND"""
+    name = name or os.getenv("EMBED_BACKEND", DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"未知的嵌入后端: {name}，可选: {', '.join(BACKENDS)}")
+    return name
+
+
+def load_model(backend=None, model_name=MODEL_NAME):
+    """加载嵌入模型，返回与SentenceTransformer接口兼容的对象"""
+    backend = get_backend(backend)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return OnnxEncoder(ensure_onnx_model(backend == "onnx-int8", model_name))
+
+
+def model_source(model_name=MODEL_NAME):
+    """本地模型目录直接使用，否则为 sentence-transformers 组织下的模型名称"""
+    return model_name if os.path.isdir(model_name) else f"sentence-transformers/{model_name}"
+
+
+def onnx_model_dir(model_name=MODEL_NAME):
+    return os.path.join(ONNX_DIR, os.path.basename(os.path.normpath(model_name)))
+
+
+def ensure_onnx_model(quantize=False, model_name=MODEL_NAME):
+    """确保ONNX模型已导出(和量化)，返回模型文件路径"""
+    model_dir = onnx_model_dir(model_name)
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model-int8.onnx")
+    path = int8_path if quantize else fp32_path
+
+    if not os.path.exists(path):
+        if not os.path.exists(fp32_path):
+            export_onnx(model_dir, model_name)
+        if quantize:
+            quantize_onnx(fp32_path, int8_path)
+        verify_backend("onnx-int8" if quantize else "onnx", path, model_name)
+    return path
+
+
+def export_onnx(model_dir, model_name=MODEL_NAME):
+    """将Transformer主体导出为ONNX(池化在onnxruntime之外完成)"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"正在导出ONNX模型到 {model_dir} ...")
+    os.makedirs(model_dir, exist_ok=True)
+    hf_name = model_source(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(hf_name)
+    transformer = AutoModel.from_pretrained(hf_name).eval()
+
+    class LastHiddenState(torch.nn.Module):
+        """只接收 input_ids 和 attention_mask，输出 last_hidden_state；其余参数(如use_cache)由模型取默认值"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=True).last_hidden_state
+
+    inputs = tokenizer(VERIFY_SENTENCES[:2], padding=True, return_tensors="pt")
+    tmp_path = os.path.join(model_dir, "model.onnx.tmp")
+    # 新版torch默认使用dynamo导出器(需要onnxscript且不支持dynamic_axes)，固定使用TorchScript导出器
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            (inputs["input_ids"], inputs["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+            **options
+        )
+    tokenizer.save_pretrained(model_dir)
+    os.replace(tmp_path, os.path.join(model_dir, "model.onnx"))
+
+
+def quantize_onnx(fp32_path, int8_path):
+    """对ONNX模型做动态int8量化"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"正在量化ONNX模型到 {int8_path} ...")
+    tmp_path = int8_path + ".tmp"
+    quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, int8_path)
+
+
+def cosine_similarities(a, b):
+    import numpy as np
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def verify_backend(backend, path, model_name=MODEL_NAME):
+    """比较ONNX与PyTorch的输出，最小余弦相似度低于容差时删除模型并报错"""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name).encode(VERIFY_SENTENCES)
+    candidate = OnnxEncoder(path).encode(VERIFY_SENTENCES)
+    worst = float(cosine_similarities(reference, candidate).min())
+    tolerance = COSINE_TOLERANCE[backend]
+
+    print(f"{backend} 与 PyTorch 输出的最小余弦相似度: {worst:.6f} (容差 {tolerance})")
+    if worst < tolerance:
+        os.remove(path)
+        raise RuntimeError(f"{backend} 模型输出超出容差: {worst:.6f} < {tolerance}")
+    return worst
+
+
+class OnnxEncoder:
+    """用onnxruntime执行Transformer，并做与SentenceTransformer一致的平均池化"""
+
+    def __init__(self, path, max_seq_length=MAX_SEQ_LENGTH):
+        from transformers import AutoTokenizer
+
+        self.path = path
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+        # 推理会话在首次编码时创建，使预加载后fork的工作进程各自拥有线程池
+        self._session = None
+        self._dimension = None
+
+    def _get_session(self):
+        if self._session is None:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            num_threads = int(os.getenv("EMBED_NUM_THREADS", "0"))
+            if num_threads > 0:
+                options.intra_op_num_threads = num_threads
+            self._session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        return self._session
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """编码文本，单条输入返回一维向量，列表输入返回二维数组"""
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        session = self._get_session()
+        # 按长度排序后分批，减少padding，输出时恢复原顺序
+        order = np.argsort([len(sentence) for sentence in sentences], kind="stable")
+        sentences = [sentences[i] for i in order]
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            mask = inputs["attention_mask"].astype(np.int64)
+            hidden = session.run(None, {
+                "input_ids": inputs["input_ids"].astype(np.int64),
+                "attention_mask": mask,
+            })[0]
+            # 平均池化(忽略padding)
+            mask = mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled.astype(np.float32))
+
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        embeddings[order] = embeddings.copy()
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self):
+        if self._dimension is None:
+            self._dimension = int(self.encode("dimension").shape[0])
+        return self._dimension
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出并校验ONNX嵌入模型")
+    parser.add_argument("command", choices=["export"], help="export: 导出、量化并校验")
+    parser.add_argument("--backend", type=str, choices=BACKENDS[1:], default="onnx-int8", help="要导出的ONNX后端")
+    args = parser.parse_args()
+
+    quantize = args.backend == "onnx-int8"
+    path = os.path.join(onnx_model_dir(), "model-int8.onnx" if quantize else "model.onnx")
+    if os.path.exists(path):
+        # 已存在的模型重新校验一次
+        verify_backend(args.backend, path)
+    else:
+        ensure_onnx_model(quantize)
+    print(f"模型已就绪: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+本地磁盘嵌入缓存
+所有导入脚本、搜索脚本和服务器共用，按 (模型, 规范化文本的哈希) 缓存向量，
+重建集合或更换HNSW参数时不需要重新推理。
+
+  - 向量以float32存放在内存映射文件 vectors.f32 中，每个槽位一条向量
+  - 索引(SQLite)记录 键 -> 槽位、校验和、最近使用时间
+  - 超过容量时淘汰最久未使用的条目，复用其槽位；命中时的使用时间攒批写入，淘汰顺序是近似的
+  - 读取时校验向量的CRC32，槽位被其他进程改写时按未命中处理，多个进程可同时读写
+
+环境变量:
+  EMBED_DISK_CACHE            是否启用 (默认 true)
+  EMBED_DISK_CACHE_DIR        缓存目录 (默认 ~/.cache/qdrant-embeddings/vectors)
+  EMBED_DISK_CACHE_MAX_BYTES  每个模型的向量文件大小上限 (默认 1GiB)
+"""
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+
+from query_cache import normalize_text
+
+CACHE_ENABLED = os.getenv("EMBED_DISK_CACHE", "true").lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("EMBED_DISK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "qdrant-embeddings", "vectors"))
+CACHE_MAX_BYTES = int(os.getenv("EMBED_DISK_CACHE_MAX_BYTES", str(1 << 30)))
+
+# SQLite单条语句的参数个数有限，分批查询
+_QUERY_CHUNK = 500
+
+# 命中时的最近使用时间先记在内存中，攒够一批、超过间隔(秒)或写入新向量时再一起写入索引，
+# 读取路径上不必每次都执行写事务
+_TOUCH_BATCH = 1000
+_TOUCH_INTERVAL = 30.0
+
+
+def text_key(text):
+    """规范化文本的SHA-256，作为缓存键"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+def _checksum(vector):
+    return zlib.crc32(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+
+class EmbeddingCache:
+    """一个模型的磁盘向量缓存"""
+
+    def __init__(self, model_key, dimension, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.dimension = int(dimension)
+        self.capacity = max(1, int(max_bytes) // (self.dimension * 4))
+        self.path = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_key))
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout=30, check_same_thread=False)
+        # WAL模式下读取不阻塞写入
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, checksum INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        # 在写事务中检查维度并扩展向量文件，避免多个进程同时初始化
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+            if row is None or row[0] != self.dimension:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dimension', ?)", (self.dimension,))
+            # 容量调小时丢弃超出范围的槽位
+            self._conn.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+            size = self.capacity * self.dimension * 4
+            with open(vectors_path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+
+        self.hits = 0
+        self.misses = 0
+        # 尚未写入索引的 {键: 最近使用时间}
+        self._touched = {}
+        self._touched_at = time.monotonic()
+
+    def _write_touched(self):
+        """把攒下的使用时间写入索引，调用方持有锁并负责提交事务"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def get_many(self, keys):
+        """返回 {键: 向量}，只包含命中且校验通过的条目"""
+        keys = list(set(keys))
+        found = {}
+        with self._lock:
+            rows = []
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT key, slot, checksum FROM entries WHERE key IN ({placeholders})", chunk
+                ))
+            for key, slot, checksum in rows:
+                vector = np.array(self._vectors[slot])
+                if _checksum(vector) == checksum:
+                    found[key] = vector
+            now = time.time()
+            for key in found:
+                self._touched[key] = now
+            if len(self._touched) >= _TOUCH_BATCH or (self._touched and time.monotonic() - self._touched_at >= _TOUCH_INTERVAL):
+                with self._conn:
+                    self._write_touched()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys, vectors):
+        """写入向量，容量不足时淘汰最久未使用的条目"""
+        items = dict(zip(keys, vectors))
+        if not items:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # 先写入攒下的使用时间，淘汰时按最新的使用顺序
+            self._write_touched()
+            # 其他进程可能已写入相同的键
+            keys = list(items)
+            existing = set()
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders})", chunk
+                ))
+            new_keys = [key for key in keys if key not in existing][:self.capacity]
+            if not new_keys:
+                return
+
+            count, next_slot = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(slot), -1) + 1 FROM entries").fetchone()
+            free = max(0, min(len(new_keys), self.capacity - count, self.capacity - next_slot))
+            slots = list(range(next_slot, next_slot + free))
+            if len(slots) < len(new_keys):
+                evicted = self._conn.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (len(new_keys) - len(slots),)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                slots.extend(slot for _, slot in evicted)
+
+            now = time.time()
+            rows = []
+            for key, slot in zip(new_keys, slots):
+                vector = np.asarray(items[key], dtype=np.float32)
+                self._vectors[slot] = vector
+                rows.append((key, slot, _checksum(vector), now))
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, slot, checksum, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            with self._conn:
+                self._write_touched()
+            self._conn.close()
+        del self._vectors
+
+
+class CachedEncoder:
+    """在模型外层查询磁盘缓存，只编码未命中的文本；接口与SentenceTransformer一致"""
+
+    def __init__(self, model, model_key, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.model = model
+        self.model_key = model_key
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._cache = None
+        self._disabled = False
+
+    def __getattr__(self, name):
+        # 其余属性(如多进程池的 workers)转发给原模型
+        return getattr(self.model, name)
+
+    @property
+    def cache(self):
+        """首次使用时打开缓存(在fork出的工作进程中各自打开)，打开失败时退化为直接编码"""
+        if self._cache is None and not self._disabled:
+            try:
+                self._cache = EmbeddingCache(
+                    self.model_key, self.model.get_sentence_embedding_dimension(), self.directory, self.max_bytes
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"嵌入缓存不可用，直接编码: {e}")
+                self._disabled = True
+        return self._cache
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """
+        缓存命中的文本直接返回向量，其余文本批量编码并写入缓存。
+        缓存键按规范化后的文本计算，编码的仍是原文本(与不使用缓存时的输出一致)
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        cache = self.cache
+        if cache is None:
+            return self.model.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar, **kwargs)
+
+        keys = [text_key(text) for text in texts]
+        found = cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.model.encode(
+                list(missing.values()),
+                batch_size=max(1, min(batch_size, len(missing))),
+                show_progress_bar=show_progress_bar,
+                **kwargs
+            )
+            vectors = np.asarray(vectors, dtype=np.float32)
+            cache.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+
+        if not keys:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        embeddings = np.stack([found[key] for key in keys])
+        return embeddings[0] if single else embeddings
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def cache_stats(self):
+        return self._cache.stats() if self._cache is not None else None
+
+    def print_cache_stats(self):
+        stats = self.cache_stats()
+        if stats is not None:
+            print(f"嵌入缓存: 命中 {stats['hits']} 条, 未命中 {stats['misses']} 条 "
+                  f"(命中率 {stats['hit_rate']:.1%}, 共 {stats['entries']}/{stats['capacity']} 条)")
+
+
+def cached_encoder(model, model_name, backend):
+    """用磁盘缓存包装模型，EMBED_DISK_CACHE 关闭时原样返回"""
+    if not CACHE_ENABLED:
+        return model
+    return CachedEncoder(model, f"{model_name}-{backend}")
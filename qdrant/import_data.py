@@ -1,96 +1,94 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
 import argparse
-from tqdm import tqdm
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
-import uuid
-import csv
-import pandas as pd
+import itertools
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import PROFILES, collection_config
+from embedding_backend import BACKENDS, MODEL_NAME, get_backend
+from embed_pool import ProcessEmbeddingPool, create_encoder
+from import_manifest import ImportManifest, content_id
+from chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, TokenChunker, chunk_items
+from import_profile import import_profiler, profile_stage
+from payload_index import auto_index, parse_fields
+# qdrant_client、numpy 和 pandas 在用到时才导入，参数错误和帮助信息可以立即返回
 
-def load_data_from_csv(csv_path):
-    """从CSV文件加载数据"""
+def load_data_from_csv(csv_path, chunksize=10000):
+    """
+    从CSV文件分块流式加载数据，返回文档生成器。
+    文件无法解析时抛出异常(pandas的解析错误是ValueError的子类)，由调用方中止导入
+    """
     print(f"正在从 {csv_path} 加载数据...")
+    with startup_phase("导入模块"):
+        import pandas as pd
     
-    try:
-        df = pd.read_csv(csv_path)
-        documents = []
-        
-        # 检查必要的列是否存在
-        if 'text' not in df.columns:
-            print("错误: CSV文件必须包含'text'列")
-            return []
-        
-        for _, row in df.iterrows():
-            doc = {
-                "text": row['text'],
-                "metadata": {}
-            }
-            
-            # 将其他列作为元数据
-            for col in df.columns:
-                if col != 'text':
-                    doc["metadata"][col] = row[col]
-            
-            documents.append(doc)
-        
-        print(f"成功加载了 {len(documents)} 条数据")
-        return documents
-    except Exception as e:
-        print(f"加载CSV数据时出错: {str(e)}")
-        return []
+    # 只读取表头，检查必要的列是否存在
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    if 'text' not in columns:
+        raise ValueError("CSV文件必须包含'text'列")
+    
+    return _iter_csv(csv_path, chunksize)
+
+def _iter_csv(csv_path, chunksize):
+    import pandas as pd
+    count = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        # 按列整体转换: 空值转为None，numpy标量转为Python对象
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        texts = chunk.pop('text').tolist()
+        for text, metadata in zip(texts, chunk.to_dict('records')):
+            if text is None:
+                continue
+            yield {"text": str(text), "metadata": metadata}
+            count += 1
+    print(f"成功加载了 {count} 条数据")
+
+def iter_lines(path, start_line=None, end_line=None):
+    """逐行读取文件，产出 (行号, 行内容)，行号从1开始，可限定行号范围(包含两端)"""
+    start = max(1, start_line or 1)
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = itertools.islice(f, start - 1, end_line)
+        for line_number, line in enumerate(lines, start):
+            yield line_number, line
 
-def load_data_from_jsonl(jsonl_path):
-    """从JSONL文件加载数据"""
+def load_data_from_jsonl(jsonl_path, start_line=None, end_line=None):
+    """从JSONL文件逐行流式加载数据，返回文档生成器，遇到无效的行时抛出ValueError(包含行号)"""
     print(f"正在从 {jsonl_path} 加载数据...")
     
-    documents = []
-    try:
-        with open(jsonl_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    item = json.loads(line)
-                    if isinstance(item, dict) and "text" in item:
-                        doc = {
-                            "text": item["text"],
-                            "metadata": {}
-                        }
-                        # 将除text外的所有字段作为元数据
-                        for key, value in item.items():
-                            if key != "text":
-                                doc["metadata"][key] = value
-                        documents.append(doc)
-        
-        print(f"成功加载了 {len(documents)} 条数据")
-        return documents
-    except Exception as e:
-        print(f"加载JSONL数据时出错: {str(e)}")
-        return []
+    count = 0
+    for line_number, line in iter_lines(jsonl_path, start_line, end_line):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"第 {line_number} 行不是有效的JSON ({str(e)})") from e
+        if isinstance(item, dict) and "text" in item:
+            text = item.pop("text")
+            # 将除text外的所有字段作为元数据
+            yield {"text": text, "metadata": item}
+            count += 1
+    print(f"成功加载了 {count} 条数据")
 
-def load_data_from_text(text_path):
-    """从纯文本文件加载数据，每行作为一条记录"""
+def load_data_from_text(text_path, start_line=None, end_line=None):
+    """从纯文本文件逐行流式加载数据，每行作为一条记录，返回文档生成器"""
     print(f"正在从 {text_path} 加载数据...")
     
-    documents = []
-    try:
-        with open(text_path, 'r', encoding='utf-8') as f:
-            for i, line in enumerate(f):
-                if line.strip():
-                    doc = {
-                        "text": line.strip(),
-                        "metadata": {
-                            "line_number": i + 1,
-                            "source_file": os.path.basename(text_path)
-                        }
-                    }
-                    documents.append(doc)
-        
-        print(f"成功加载了 {len(documents)} 条数据")
-        return documents
-    except Exception as e:
-        print(f"加载文本数据时出错: {str(e)}")
-        return []
+    count = 0
+    source_file = os.path.basename(text_path)
+    for line_number, line in iter_lines(text_path, start_line, end_line):
+        text = line.strip()
+        if text:
+            yield {
+                "text": text,
+                "metadata": {
+                    "line_number": line_number,
+                    "source_file": source_file
+                }
+            }
+            count += 1
+    print(f"成功加载了 {count} 条数据")
 
 def create_sample_data(num_samples=10):
     """创建示例数据"""
@@ -124,64 +122,110 @@ def create_sample_data(num_samples=10):
     print(f"成功创建了 {len(documents)} 条示例数据")
     return documents
 
-def import_to_qdrant(documents, collection_name="knowledge_base", host="localhost", port=6333):
-    """将文档导入到Qdrant"""
+def import_to_qdrant(documents, collection_name="knowledge_base", host="localhost", port=6333, profile=None, backend=None, batch_size=64, workers=1, full=False, prune=False, chunker=None, export=None, index_fields=None, skip_index_fields=None, auto_indexes=True):
+    """
+    将文档(列表或生成器)导入到Qdrant，默认跳过已导入且内容未变化的文档。
+    export 指定时只编码并写入向量文件(Parquet)，不连接Qdrant，之后用 bulk_load.py 加载。
+    上传之前按输入样本建立payload索引: index_fields 为总是建立索引的 {字段: 类型}，
+    skip_index_fields 中的字段不建索引，auto_indexes=False 时只建立 index_fields
+    """
     if not documents:
         print("没有数据可导入")
         return
     
-    print(f"正在连接到 Qdrant ({host}:{port})...")
-    client = QdrantClient(host=host, port=port)
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+        from embedding_cache import cached_encoder
+        from sparse_encoder import has_sparse_vectors
+        from import_pipeline import ImportPipeline, document_items
+        from vector_export import ParquetExporter
+    
+    client = None
+    if not export:
+        print(f"正在连接到 Qdrant ({host}:{port})...")
+        client = QdrantClient(host=host, port=port)
     
     # 加载嵌入模型
     print("正在加载嵌入模型...")
-    model_name = "paraphrase-multilingual-MiniLM-L12-v2"
-    model = SentenceTransformer(model_name)
+    with profile_stage("load_model"), startup_phase("加载模型"):
+        model = create_encoder(backend, workers, MODEL_NAME)
     vector_size = model.get_sentence_embedding_dimension()
     
-    # 检查集合是否存在，不存在则创建
-    collections = client.get_collections().collections
-    collection_names = [collection.name for collection in collections]
-    
-    if collection_name not in collection_names:
-        print(f"正在创建集合 {collection_name}...")
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                "size": vector_size,
-                "distance": "Cosine"
-            }
-        )
-    
-    # 准备批量导入的数据
-    print("正在生成嵌入向量...")
-    points = []
-    
-    for doc in tqdm(documents):
-        text = doc["text"]
-        embedding = model.encode(text).tolist()
-        point_id = str(uuid.uuid4())
+    exporter = None
+    manifest = None
+    if export:
+        # 导出文件总是包含稀疏向量，加载时按目标集合的配置决定是否写入
+        with_sparse = True
+        exporter = ParquetExporter(export, vector_size, with_sparse=True, model_name=MODEL_NAME, backend=get_backend(backend))
+    else:
+        # 检查集合是否存在，不存在则创建(第一次请求时建立连接)
+        with startup_phase("连接Qdrant"):
+            collections = client.get_collections().collections
+        collection_names = [collection.name for collection in collections]
         
-        payload = doc.get("metadata", {})
-        payload["text"] = text
+        if collection_name not in collection_names:
+            print(f"正在创建集合 {collection_name}...")
+            client.create_collection(
+                collection_name=collection_name,
+                **collection_config(vector_size, profile, sparse=True)
+            )
         
-        points.append({
-            "id": point_id,
-            "vector": embedding,
-            "payload": payload
-        })
-    
-    # 批量导入数据
-    print(f"正在导入 {len(points)} 个点到 Qdrant...")
-    batch_size = 100
-    for i in tqdm(range(0, len(points), batch_size)):
-        batch = points[i:i+batch_size]
-        client.upsert(
-            collection_name=collection_name,
-            points=batch
-        )
-    
-    print(f"成功导入了 {len(points)} 条数据到 {collection_name} 集合")
+        # 集合配置了稀疏向量时同时写入BM25稀疏向量，用于混合检索
+        with_sparse = has_sparse_vectors(client.get_collection(collection_name))
+        
+        # 增量导入清单: 点ID由内容哈希派生，未变化的文档直接跳过
+        manifest = ImportManifest(collection_name, host, port)
+        manifest.sync_with_collection(client, collection_name)
+    
+    print_startup_timing()
+    # 读取、编码、上传并行进行
+    print(f"正在生成嵌入向量并{'导出到 ' + export if export else '导入到 Qdrant'}...")
+    encoder = cached_encoder(model, MODEL_NAME, get_backend(backend))
+    pipeline = ImportPipeline(
+        encoder, exporter or client, collection_name,
+        with_sparse=with_sparse,
+        encode_batch_size=batch_size * max(1, workers),
+        id_fn=content_id,
+        manifest=manifest,
+        skip_imported=not full
+    )
+    try:
+        items = document_items(documents)
+        if client is not None:
+            # 在上传之前建立过滤字段的索引，之后写入的点直接进入索引
+            with profile_stage("index"):
+                items = auto_index(client, collection_name, items, index_fields, skip_index_fields, auto_indexes)
+        if chunker is not None:
+            # 长文档切分为重叠窗口，每个窗口单独成点
+            items = chunk_items(items, chunker)
+        count = pipeline.run(items)
+    except BaseException:
+        if exporter is not None:
+            exporter.abort()
+        raise
+    finally:
+        if hasattr(encoder, "print_cache_stats"):
+            encoder.print_cache_stats()
+        if isinstance(model, ProcessEmbeddingPool):
+            model.print_stats()
+            model.close()
+    
+    if exporter is not None:
+        exporter.close()
+        print(f"成功导出了 {count} 条数据到 {export}")
+        return
+    
+    if count:
+        print(f"成功导入了 {count} 条数据到 {collection_name} 集合")
+    elif not pipeline.skipped:
+        print("没有数据可导入")
+
+    # 删除本次输入中已不存在(或内容已变化)的旧文档
+    if prune:
+        with profile_stage("prune"):
+            removed = manifest.prune(client, collection_name)
+        print(f"已删除 {removed} 条输入中不再存在的文档")
+    manifest.close()
 
 def main():
     parser = argparse.ArgumentParser(description="导入数据到Qdrant向量数据库")
@@ -191,7 +235,27 @@ def main():
     parser.add_argument("--host", type=str, default="localhost", help="Qdrant服务器主机名")
     parser.add_argument("--port", type=int, default=6333, help="Qdrant服务器端口")
     parser.add_argument("--collection", type=str, default="knowledge_base", help="Qdrant集合名称")
+    parser.add_argument("--profile", type=str, choices=list(PROFILES),
+                        help="新建集合时使用的性能配置 (默认读取环境变量QDRANT_PROFILE)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS,
+                        help="嵌入模型后端 (默认读取环境变量EMBED_BACKEND)")
+    parser.add_argument("--batch_size", type=int, default=64, help="每次编码的文档数 (多进程时为每个进程)")
+    parser.add_argument("--workers", type=int, default=1, help="嵌入进程数，大于1时每个进程加载一份模型并行编码")
     parser.add_argument("--samples", type=int, default=10, help="使用sample选项时创建的示例数量")
+    parser.add_argument("--csv_chunksize", type=int, default=10000, help="CSV每次解析的行数")
+    parser.add_argument("--start_line", type=int, help="JSONL/TXT: 起始行号(从1开始)")
+    parser.add_argument("--end_line", type=int, help="JSONL/TXT: 结束行号(包含)")
+    parser.add_argument("--full", action="store_true", help="重新导入所有文档，不跳过已导入的文档")
+    parser.add_argument("--prune", action="store_true", help="导入后删除集合中输入里已不存在的文档")
+    parser.add_argument("--export", type=str, help="只编码并写入向量文件(.parquet)，不连接Qdrant，之后用bulk_load.py加载")
+    parser.add_argument("--chunk", action="store_true", help="将超过模型长度的文档切分为重叠窗口分别导入")
+    parser.add_argument("--chunk_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="每个窗口的token数")
+    parser.add_argument("--chunk_overlap", type=int, default=DEFAULT_OVERLAP, help="相邻窗口重叠的token数")
+    parser.add_argument("--index_fields", type=str, help="总是建立payload索引的字段，逗号分隔，可指定类型(如 brand,year:integer)")
+    parser.add_argument("--skip_index_fields", type=str, help="不建立payload索引的字段，逗号分隔")
+    parser.add_argument("--no_auto_index", action="store_true", help="不按输入样本自动建立payload索引")
+    parser.add_argument("--report", type=str, help="输出各阶段耗时、吞吐量和峰值内存，并写入JSON报告(如 import_report.json)")
+    parser.add_argument("--report_stacks", action="store_true", help="同时采样调用栈，报告最耗时阶段的热点函数")
     
     args = parser.parse_args()
     
@@ -200,22 +264,57 @@ def main():
         print("没有提供数据文件，使用示例数据...")
         args.file_type = "sample"
     
+    if args.file and not os.path.exists(args.file):
+        print(f"文件不存在: {args.file}")
+        return
+    
+    # 只导入部分行时，其余行会被误判为已删除
+    if args.prune and (args.start_line or args.end_line):
+        print("--prune 不能与 --start_line/--end_line 同时使用")
+        return
+    if args.prune and args.export:
+        print("--prune 不能与 --export 同时使用")
+        return
+    
     # 加载数据
     documents = []
     if args.file_type == "csv" and args.file:
-        documents = load_data_from_csv(args.file)
+        try:
+            documents = load_data_from_csv(args.file, args.csv_chunksize)
+        except (OSError, ValueError) as e:
+            print(f"加载CSV数据时出错: {e}")
+            sys.exit(1)
     elif args.file_type == "jsonl" and args.file:
-        documents = load_data_from_jsonl(args.file)
+        documents = load_data_from_jsonl(args.file, args.start_line, args.end_line)
     elif args.file_type == "txt" and args.file:
-        documents = load_data_from_text(args.file)
+        documents = load_data_from_text(args.file, args.start_line, args.end_line)
     elif args.file_type == "sample":
         documents = create_sample_data(args.samples)
     else:
         print("请提供有效的文件路径和类型")
         return
     
-    # 导入到Qdrant
-    import_to_qdrant(documents, args.collection, args.host, args.port)
+    try:
+        chunker = TokenChunker(args.chunk_tokens, args.chunk_overlap) if args.chunk else None
+    except ValueError as e:
+        print(f"分块参数无效: {e}")
+        return
+    
+    try:
+        index_fields = parse_fields(args.index_fields)
+        skip_index_fields = set(parse_fields(args.skip_index_fields))
+    except ValueError as e:
+        print(f"索引字段无效: {e}")
+        return
+    
+    # 导入到Qdrant；输入读取出错时整个导入中止(不输出成功信息，也不执行 --prune)，以非零状态退出
+    try:
+        with import_profiler(args.report, args.report_stacks):
+            import_to_qdrant(documents, args.collection, args.host, args.port, args.profile, args.backend, args.batch_size, args.workers, args.full, args.prune, chunker, args.export,
+                             index_fields, skip_index_fields, not args.no_auto_index)
+    except (OSError, ValueError) as e:
+        print(f"读取或导入数据失败: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+内容寻址ID与增量导入清单
+  - 点ID由文档内容(文本 + payload)的SHA-256派生，同一文档每次导入得到相同ID
+  - 本地清单(SQLite)记录每个集合已导入的ID，重新导入时跳过未变化的文档
+  - 清单中存在、但本次输入中不再出现的文档可以选择从集合中删除；
+    只有在输入被完整读取并成功导入之后(mark_complete)才允许删除
+
+清单目录由环境变量 IMPORT_MANIFEST_DIR 指定，默认 ~/.cache/qdrant-embeddings/manifests
+"""
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import sqlite3
+import threading
+
+MANIFEST_DIR = os.getenv("IMPORT_MANIFEST_DIR", os.path.join(os.path.expanduser("~"), ".cache", "qdrant-embeddings", "manifests"))
+
+# 每次导入都会变化、不参与内容哈希的字段
+VOLATILE_FIELDS = {"import_date"}
+
+
+def content_hash(text, payload):
+    """文档内容的SHA-256 (payload按键排序后序列化)"""
+    stable = {k: v for k, v in payload.items() if k not in VOLATILE_FIELDS}
+    canonical = json.dumps([text, stable], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+def content_id(text, payload, index=None):
+    """由内容哈希派生的点ID (UUID格式，Qdrant可直接使用)"""
+    return str(uuid.UUID(bytes=content_hash(text, payload)[:16]))
+
+
+class ImportManifest:
+    """记录某个集合已导入的点ID，支持跳过已导入文档和清理消失的文档"""
+
+    def __init__(self, collection_name, host="localhost", port=6333, directory=MANIFEST_DIR):
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{host}_{port}_{collection_name}")
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        # 读取线程与上传线程共用一个连接，用锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS points (id TEXT PRIMARY KEY, run INTEGER NOT NULL)")
+        self._conn.commit()
+        self.run = self._conn.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM points").fetchone()[0]
+        # 本次导入是否完整读取了输入，未完整读取时不能判断哪些文档已被删除
+        self.complete = False
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def filter_imported(self, ids):
+        """返回ids中已导入过的ID集合(与传入的ID类型相同)，并将它们标记为本次导入中出现过"""
+        # 清单中的ID以字符串保存，整数ID(如从向量文件加载的点)按字符串查询后还原
+        keys = {str(i): i for i in ids}
+        ids = list(keys)
+        found = set()
+        with self._lock:
+            # SQLite单条语句的参数个数有限，分批查询
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT id FROM points WHERE id IN ({placeholders})", chunk)
+                found.update(row[0] for row in rows)
+            self._conn.executemany("UPDATE points SET run = ? WHERE id = ?", [(self.run, i) for i in found])
+            self._conn.commit()
+        return {keys[i] for i in found}
+
+    def record(self, ids):
+        """记录已成功上传的ID"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (id, run) VALUES (?, ?)",
+                [(str(i), self.run) for i in ids]
+            )
+            self._conn.commit()
+
+    def stale_ids(self):
+        """本次导入中没有出现过的ID(输入中已删除或内容已变化的文档)"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM points WHERE run != ?", (self.run,))]
+
+    def remove(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM points WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM points")
+            self._conn.commit()
+
+    def sync_with_collection(self, client, collection_name):
+        """集合为空(新建或被清空)时清单已失效，清空清单"""
+        if len(self) and client.count(collection_name=collection_name, exact=False).count == 0:
+            print("集合为空，清空本地导入清单")
+            self.clear()
+
+    def mark_complete(self):
+        """标记本次导入已完整读取输入且没有出错，之后才能调用prune"""
+        self.complete = True
+
+    def prune(self, client, collection_name, batch_size=1000):
+        """从集合中删除本次输入中不再出现的文档，返回删除的数量"""
+        from qdrant_client.http.models import PointIdsList
+
+        if not self.complete:
+            # 输入读取中途出错时，未读到的文档会被误判为已删除
+            raise RuntimeError("本次导入没有完整读取输入，拒绝删除文档")
+        stale = self.stale_ids()
+        for start in range(0, len(stale), batch_size):
+            chunk = stale[start:start + batch_size]
+            client.delete(collection_name=collection_name, points_selector=PointIdsList(points=chunk))
+            self.remove(chunk)
+        return len(stale)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+流水线导入引擎
+读取、批量编码、分块上传三个阶段在各自线程中并行运行，阶段之间用有界队列连接:
+
+    读取线程 --(文本批次)--> 编码线程 --(点批次)--> 上传线程 --> 多个并发上传请求
+
+读取阶段预读 sort_window 个编码批次，按文本长度排序后再切分批次，
+同一批次内的文本长度相近，编码时padding更少。
+
+队列有界，内存占用只与批次大小和队列长度有关，与文件大小无关；
+编码(CPU)与上传(网络)同时进行。
+
+上传阶段同时保持多个批次在途(wait=False)，按序列化字节数和观测到的延迟调整每批点数，
+临时错误按指数退避重试(点ID在读取阶段已确定，重试不会产生重复的点)，
+全部批次确认后再发送一次 wait=True 的写入作为一致性屏障。
+
+各阶段用 profile_stage 记录耗时，导入脚本的 --report 输出每个阶段的统计(见 import_profile.py)。
+
+环境变量:
+  IMPORT_UPSERT_CONCURRENCY     同时在途的上传请求数 (默认 4)
+  IMPORT_UPSERT_TARGET_SECONDS  单次上传的目标耗时，用于调整批次大小 (默认 1.0)
+  IMPORT_UPSERT_MAX_BYTES       单次上传的序列化字节数上限 (默认 8MiB)
+  IMPORT_UPSERT_RETRIES         临时错误的最大重试次数 (默认 5)
+"""
+
+import os
+import json
+import queue
+import itertools
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from tqdm import tqdm
+from qdrant_client.http.models import Batch
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document
+from import_profile import profile_stage
+
+# 队列结束标记
+_DONE = object()
+
+UPSERT_CONCURRENCY = int(os.getenv("IMPORT_UPSERT_CONCURRENCY", "4"))
+UPSERT_TARGET_SECONDS = float(os.getenv("IMPORT_UPSERT_TARGET_SECONDS", "1.0"))
+UPSERT_MAX_BYTES = int(os.getenv("IMPORT_UPSERT_MAX_BYTES", str(8 * 1024 * 1024)))
+UPSERT_RETRIES = int(os.getenv("IMPORT_UPSERT_RETRIES", "5"))
+
+# 可重试的HTTP状态码
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# 可重试的gRPC状态
+_TRANSIENT_GRPC = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "ABORTED"}
+
+
+def random_id(text, payload, index):
+    """默认的点ID: 随机UUID"""
+    return str(uuid.uuid4())
+
+
+def is_local_client(client):
+    """本地模式(path= 或 :memory:)的客户端在进程内直接读写，不支持并发写入"""
+    return type(getattr(client, "_client", None)).__name__ == "QdrantLocal"
+
+
+def is_transient(error):
+    """网络错误、超时、限流和服务端5xx视为临时错误"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in _TRANSIENT_STATUS
+    code = getattr(error, "code", None)
+    if callable(code):
+        # grpc.RpcError
+        try:
+            return getattr(code(), "name", None) in _TRANSIENT_GRPC
+        except Exception:
+            return False
+    # qdrant_client 的 ResponseHandlingException 包装了底层的网络错误
+    return type(error).__name__ == "ResponseHandlingException"
+
+
+class PointBatch:
+    """
+    一批待上传的点。稠密向量保持为连续的float32数组(编码输出原样传递，切分是视图)，
+    只在发送时一次性转换为 Batch 请求所需的列表，避免为每个点构造 PointStruct。
+    """
+
+    def __init__(self, ids, vectors, payloads, sparse=None, sizes=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.payloads = payloads
+        # BM25稀疏向量，未启用混合检索时为None
+        self.sparse = sparse
+        # 每个点序列化后的估算字节数
+        self.sizes = sizes if sizes is not None else self._estimate_sizes()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _estimate_sizes(self):
+        dense = 12 * self.vectors.shape[1] + 64
+        sizes = np.array(
+            [dense + len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")) for payload in self.payloads],
+            dtype=np.int64
+        )
+        if self.sparse is not None:
+            # 稀疏向量: 索引 + 权重
+            sizes += np.array([24 * len(vector.indices) for vector in self.sparse], dtype=np.int64)
+        return sizes
+
+    def slice(self, start, stop):
+        return PointBatch(
+            self.ids[start:stop], self.vectors[start:stop], self.payloads[start:stop],
+            self.sparse[start:stop] if self.sparse is not None else None, self.sizes[start:stop]
+        )
+
+    def select(self, indices):
+        """按下标取出部分点(向量为副本)"""
+        return PointBatch(
+            [self.ids[i] for i in indices], self.vectors[indices], [self.payloads[i] for i in indices],
+            [self.sparse[i] for i in indices] if self.sparse is not None else None, self.sizes[indices]
+        )
+
+    @classmethod
+    def concat(cls, batches):
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            [i for batch in batches for i in batch.ids],
+            np.concatenate([batch.vectors for batch in batches]),
+            [payload for batch in batches for payload in batch.payloads],
+            [vector for batch in batches for vector in batch.sparse] if batches[0].sparse is not None else None,
+            np.concatenate([batch.sizes for batch in batches])
+        )
+
+    def to_request(self, vector_name=None):
+        """转换为 upsert 请求的 Batch，此处才创建线格式需要的Python浮点数"""
+        dense = self.vectors.tolist()
+        if vector_name or self.sparse is not None:
+            vectors = {vector_name or "": dense}
+            if self.sparse is not None:
+                vectors[SPARSE_VECTOR_NAME] = self.sparse
+        else:
+            vectors = dense
+        return Batch(ids=self.ids, vectors=vectors, payloads=self.payloads)
+
+
+class AdaptiveBatchSize:
+    """根据上传耗时调整每批点数: 明显快于目标时增大，慢于目标或出错时减小"""
+
+    def __init__(self, initial=100, minimum=8, maximum=4096,
+                 target_seconds=UPSERT_TARGET_SECONDS, max_bytes=UPSERT_MAX_BYTES):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+
+    def take(self, buffer):
+        """从缓冲区(PointBatch列表)头部取出一批点，受点数和字节数上限约束(至少一个点)"""
+        parts = []
+        count = 0
+        total = 0
+        while buffer and count < self.size:
+            head = buffer[0]
+            sizes = np.cumsum(head.sizes[:self.size - count]) + total
+            n = max(int(np.searchsorted(sizes, self.max_bytes, side="right")), 0 if parts else 1)
+            if n == 0:
+                break
+            total = int(sizes[n - 1])
+            count += n
+            if n == len(head):
+                parts.append(buffer.pop(0))
+            else:
+                parts.append(head.slice(0, n))
+                buffer[0] = head.slice(n, len(head))
+                break
+        return PointBatch.concat(parts)
+
+    def observe(self, count, seconds):
+        """记录一次成功上传，满批次时才调整大小"""
+        if count < self.size:
+            return
+        if seconds < self.target_seconds / 2:
+            self.size = min(self.maximum, int(self.size * 1.5) + 1)
+        elif seconds > self.target_seconds:
+            self.size = max(self.minimum, int(self.size * self.target_seconds / seconds))
+
+    def failed(self):
+        self.size = max(self.minimum, self.size // 2)
+
+
+def document_items(documents):
+    """将 {"text": ..., "metadata": {...}} 形式的文档转换为流水线输入的 (text, payload)"""
+    for doc in documents:
+        payload = doc.get("metadata", {})
+        payload["text"] = doc["text"]
+        yield doc["text"], payload
+
+
+class ImportPipeline:
+    """将 (text, payload) 序列流式编码并上传到Qdrant集合"""
+
+    def __init__(self, model, client, collection_name, vector_name=None, with_sparse=False,
+                 encode_batch_size=64, upsert_batch_size=100, queue_size=8, id_fn=random_id,
+                 manifest=None, skip_imported=True, upsert_concurrency=UPSERT_CONCURRENCY,
+                 max_retries=UPSERT_RETRIES, sort_window=8):
+        self.model = model
+        self.client = client
+        self.collection_name = collection_name
+        # 命名向量的名称，None表示默认(未命名)向量
+        self.vector_name = vector_name
+        self.with_sparse = with_sparse
+        self.encode_batch_size = encode_batch_size
+        # 按长度排序的预读批次数，1表示不排序
+        self.sort_window = max(1, sort_window)
+        # 上传批次的初始点数，之后按延迟自适应调整
+        self.upsert_batch_size = upsert_batch_size
+        # client 也可以是导出器(有 write_batch 方法)，此时点批次写入文件而不是上传
+        self._exporting = hasattr(client, "write_batch")
+        self.upsert_concurrency = 1 if is_local_client(client) or self._exporting else max(1, upsert_concurrency)
+        self.max_retries = max_retries
+        self.retries = 0
+        self.queue_size = queue_size
+        self.id_fn = id_fn
+        # 增量导入清单: 跳过已导入的文档，并记录成功上传的ID
+        self.manifest = manifest
+        self.skip_imported = skip_imported
+        self.skipped = 0
+        # 读取阶段是否读到了输入的结尾
+        self.input_complete = False
+
+        self._error = None
+        self._stop = threading.Event()
+
+    def run(self, items, desc="导入"):
+        """
+        运行流水线，items 为 (text, payload) 的可迭代对象，返回导入的点数。
+        任一阶段出错时抛出该异常；输入全部读取且上传成功后将清单标记为完整，允许prune
+        """
+        encode_queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+        count = self._run_stages([
+            ("import-read", self._read, (items, encode_queue)),
+            ("import-encode", self._encode, (encode_queue, upsert_queue)),
+        ], upsert_queue, desc)
+        if self.manifest is not None and self.input_complete:
+            self.manifest.mark_complete()
+        return count
+
+    def load(self, batches, desc="加载"):
+        """跳过编码，直接上传已有向量的点批次(PointBatch的可迭代对象)，返回上传的点数"""
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+        return self._run_stages([("import-feed", self._feed, (batches, upsert_queue))], upsert_queue, desc)
+
+    def _run_stages(self, stages, upsert_queue, desc):
+        progress = tqdm(desc=desc, unit="doc")
+        counter = {"count": 0}
+
+        threads = [
+            threading.Thread(target=self._guard, args=(stage, *args), name=name)
+            for name, stage, args in stages
+        ]
+        threads.append(threading.Thread(target=self._guard, args=(self._upsert, upsert_queue, progress, counter), name="import-upsert"))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        progress.close()
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - started
+        rate = counter["count"] / elapsed if elapsed > 0 else 0.0
+        print(f"流水线完成: {counter['count']} 条, 用时 {elapsed:.1f} 秒 ({rate:.1f} 条/秒)")
+        if self.skipped:
+            print(f"跳过 {self.skipped} 条未变化的文档")
+        if self.retries:
+            print(f"上传重试 {self.retries} 次")
+        return counter["count"]
+
+    def _guard(self, stage, *args):
+        """运行一个阶段，出错时记录异常并通知其他阶段停止"""
+        try:
+            stage(*args)
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _put(self, q, item):
+        # 带超时的put，以便在其他阶段出错时及时退出
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _read(self, items, encode_queue):
+        items = iter(items)
+        window_size = self.encode_batch_size * self.sort_window
+        index = 0
+        try:
+            while True:
+                # 读取阶段包括解析输入和计算点ID
+                with profile_stage("read") as span:
+                    window = []
+                    for text, payload in itertools.islice(items, window_size):
+                        window.append((self.id_fn(text, payload, index), text, payload))
+                        index += 1
+                    span.items = len(window)
+                if window and not self._flush_window(window, encode_queue):
+                    return
+                if len(window) < window_size:
+                    self.input_complete = True
+                    return
+        finally:
+            self._put(encode_queue, _DONE)
+
+    def _flush_window(self, window, encode_queue):
+        """去掉已导入的文档，按文本长度排序后切分为编码批次"""
+        with profile_stage("manifest", len(window)):
+            window = self._drop_imported(window)
+        if self.sort_window > 1:
+            window.sort(key=lambda item: len(item[1]))
+        for start in range(0, len(window), self.encode_batch_size):
+            if not self._put(encode_queue, window[start:start + self.encode_batch_size]):
+                return False
+        return True
+
+    def _drop_imported(self, batch):
+        """去掉清单中已导入过的文档(内容未变化，ID相同)"""
+        if not batch or self.manifest is None or not self.skip_imported:
+            return batch
+        imported = self.manifest.filter_imported([point_id for point_id, _, _ in batch])
+        if not imported:
+            return batch
+        self.skipped += sum(1 for point_id, _, _ in batch if point_id in imported)
+        return [item for item in batch if item[0] not in imported]
+
+    def _feed(self, batches, upsert_queue):
+        batches = iter(batches)
+        try:
+            while True:
+                with profile_stage("read") as span:
+                    batch = next(batches, None)
+                    span.items = len(batch) if batch is not None else 0
+                if batch is None:
+                    break
+                if self.manifest is not None and self.skip_imported:
+                    with profile_stage("manifest", len(batch)):
+                        imported = self.manifest.filter_imported(batch.ids)
+                    if imported:
+                        self.skipped += sum(1 for point_id in batch.ids if point_id in imported)
+                        batch = batch.select([i for i, point_id in enumerate(batch.ids) if point_id not in imported])
+                if len(batch) and not self._put(upsert_queue, batch):
+                    return
+        finally:
+            self._put(upsert_queue, _DONE)
+
+    def _encode(self, encode_queue, upsert_queue):
+        try:
+            while True:
+                batch = self._get(encode_queue)
+                if batch is _DONE:
+                    break
+                texts = [text for _, text, _ in batch]
+                with profile_stage("encode", len(texts)):
+                    embeddings = self.model.encode(texts, batch_size=len(texts))
+                sparse = None
+                if self.with_sparse:
+                    with profile_stage("sparse", len(texts)):
+                        sparse = [encode_document(text) for text in texts]
+                points = PointBatch(
+                    [point_id for point_id, _, _ in batch],
+                    np.ascontiguousarray(embeddings, dtype=np.float32),
+                    [payload for _, _, payload in batch],
+                    sparse
+                )
+                if not self._put(upsert_queue, points):
+                    return
+        finally:
+            self._put(upsert_queue, _DONE)
+
+    def _upsert(self, upsert_queue, progress, counter):
+        """按自适应大小重新分批，保持最多 upsert_concurrency 个请求在途"""
+        sizer = AdaptiveBatchSize(initial=self.upsert_batch_size)
+        buffer = []
+        buffered = 0
+        in_flight = set()
+        last_point = None
+
+        def complete(done):
+            for future in done:
+                in_flight.discard(future)
+                points, seconds, attempts = future.result()
+                self.retries += attempts
+                if attempts:
+                    sizer.failed()
+                else:
+                    sizer.observe(len(points), seconds)
+                if self.manifest is not None:
+                    with profile_stage("manifest", len(points)):
+                        self.manifest.record(points.ids)
+                counter["count"] += len(points)
+                progress.update(len(points))
+
+        with ThreadPoolExecutor(max_workers=self.upsert_concurrency, thread_name_prefix="import-upsert") as executor:
+            finished = False
+            while not finished and not self._stop.is_set():
+                points = self._get(upsert_queue)
+                if points is _DONE:
+                    if self._stop.is_set():
+                        break
+                    finished = True
+                else:
+                    buffer.append(points)
+                    buffered += len(points)
+                # 缓冲区凑满一批(或输入结束)时提交
+                while buffered and (finished or buffered >= sizer.size):
+                    # 先等待空闲的上传槽位，再按已完成上传调整后的大小取出下一批
+                    while len(in_flight) >= self.upsert_concurrency:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        complete(done)
+                    if not finished and buffered < sizer.size:
+                        break
+                    batch = sizer.take(buffer)
+                    buffered -= len(batch)
+                    last_point = batch.slice(len(batch) - 1, len(batch))
+                    in_flight.add(executor.submit(self._send, batch))
+            complete(wait(in_flight).done)
+
+        if finished and last_point is not None and not self._exporting:
+            # 一致性屏障: 同一集合的更新按顺序应用，wait=True 返回时之前的写入均已生效
+            with profile_stage("barrier"):
+                self.client.upsert(collection_name=self.collection_name, points=last_point.to_request(self.vector_name), wait=True)
+
+    def _send(self, points):
+        """以 wait=False 上传一批点，临时错误按指数退避重试；返回 (点, 耗时, 重试次数)"""
+        if self._exporting:
+            started = time.perf_counter()
+            with profile_stage("export", len(points)):
+                self.client.write_batch(points)
+            return points, time.perf_counter() - started, 0
+
+        with profile_stage("serialize", len(points)):
+            request = points.to_request(self.vector_name)
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                with profile_stage("upsert", len(points)):
+                    self.client.upsert(collection_name=self.collection_name, points=request, wait=False)
+                return points, time.perf_counter() - started, attempt
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e) or self._stop.is_set():
+                    raise
+                attempt += 1
+                # 带随机抖动的指数退避，避免并发请求同时重试
+                time.sleep(min(30.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0))
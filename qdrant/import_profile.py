@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+导入阶段的性能剖析
+导入脚本加上 --report 报告.json 后，记录每个阶段(解析、生成描述、编码、上传等)的
+墙钟时间、CPU时间、处理条数、吞吐量和峰值内存，结束时输出汇总表并写入JSON报告。
+
+  - 阶段用 profile_stage("名称", 条数) 包裹，没有启用剖析时是空操作
+  - 阶段可以嵌套(如解析过程中生成描述)，外层阶段只统计自身的时间
+  - CPU时间按线程统计(time.thread_time)，多进程编码(--workers)时子进程的CPU不计入
+  - 后台线程定期采样内存，记录每个阶段运行期间的峰值RSS；
+    启用 --report_stacks 时同时采样各线程的调用栈，报告中给出最耗时阶段的热点函数
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# 内存与调用栈的采样间隔(秒)
+SAMPLE_INTERVAL = 0.005
+
+# 报告中保留的热点函数和调用栈数量
+TOP_FRAMES = 20
+TOP_STACKS = 10
+
+_active = None
+
+
+def current_rss():
+    """当前进程的常驻内存(字节)，不支持时返回峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss():
+    """进程的峰值常驻内存(字节)"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _Span:
+    """profile_stage 产出的对象，可在阶段结束前设置处理的条数"""
+    __slots__ = ("items",)
+
+    def __init__(self, items=0):
+        self.items = items
+
+
+class _Stage:
+    __slots__ = ("wall", "cpu", "calls", "items", "peak_rss")
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.items = 0
+        self.peak_rss = 0
+
+
+class StageProfiler:
+    """按阶段累计时间与条数；作为上下文管理器使用时对 profile_stage 生效"""
+
+    def __init__(self, report_path=None, stacks=False, interval=SAMPLE_INTERVAL):
+        self.report_path = report_path
+        self.stacks = stacks
+        self.interval = interval
+        self._stages = {}
+        self._lock = threading.Lock()
+        # 线程ID -> 正在运行的阶段栈 [名称, 起始墙钟, 起始CPU, 子阶段墙钟, 子阶段CPU]
+        self._running = {}
+        self._stack_samples = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        global _active
+        self.started = time.perf_counter()
+        self._started_at = datetime.now().isoformat(timespec="seconds")
+        _active = self
+        self._sampler = threading.Thread(target=self._sample, name="import-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = None
+        self._stop.set()
+        self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+        # 失败的导入同样输出报告，便于定位问题
+        self.print_summary()
+        if self.report_path:
+            self.write_report(self.report_path)
+        return False
+
+    @contextmanager
+    def stage(self, name, items=0):
+        thread_id = threading.get_ident()
+        frames = self._running.setdefault(thread_id, [])
+        frame = [name, time.perf_counter(), time.thread_time(), 0.0, 0.0]
+        frames.append(frame)
+        span = _Span(items)
+        try:
+            yield span
+        finally:
+            frames.pop()
+            wall = time.perf_counter() - frame[1]
+            cpu = time.thread_time() - frame[2]
+            if frames:
+                frames[-1][3] += wall
+                frames[-1][4] += cpu
+            # 短于采样间隔的阶段也记录一次内存
+            rss = current_rss()
+            with self._lock:
+                stats = self._stages.setdefault(name, _Stage())
+                stats.wall += wall - frame[3]
+                stats.cpu += cpu - frame[4]
+                stats.calls += 1
+                stats.items += span.items
+                stats.peak_rss = max(stats.peak_rss, rss)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            frames = sys._current_frames() if self.stacks else {}
+            with self._lock:
+                for thread_id, running in list(self._running.items()):
+                    try:
+                        name = running[-1][0]
+                    except IndexError:
+                        continue
+                    stats = self._stages.setdefault(name, _Stage())
+                    stats.peak_rss = max(stats.peak_rss, rss)
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = tuple(
+                            f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+                            for entry in traceback.extract_stack(frame)
+                        )
+                        self._stack_samples.setdefault(name, Counter())[stack] += 1
+
+    def hottest_stage(self):
+        if not self._stages:
+            return None
+        return max(self._stages, key=lambda name: self._stages[name].wall)
+
+    def report(self):
+        """报告内容(dict)"""
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        stages = {}
+        for name, stats in sorted(self._stages.items(), key=lambda item: -item[1].wall):
+            stages[name] = {
+                "wall_seconds": round(stats.wall, 4),
+                "cpu_seconds": round(stats.cpu, 4),
+                "calls": stats.calls,
+                "items": stats.items,
+                "items_per_second": round(stats.items / stats.wall, 1) if stats.wall > 0 and stats.items else None,
+                # 阶段忙碌时间占总时间的比例，并发上传时可能大于1
+                "utilization": round(stats.wall / elapsed, 3) if elapsed > 0 else None,
+                "peak_rss_bytes": stats.peak_rss or None,
+            }
+        report = {
+            "command": sys.argv,
+            "started_at": self._started_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "peak_rss_bytes": peak_rss(),
+            "stages": stages,
+            "hottest_stage": self.hottest_stage(),
+        }
+        samples = self._stack_samples.get(report["hottest_stage"])
+        if samples:
+            total = sum(samples.values())
+            leaves = Counter()
+            for stack, count in samples.items():
+                leaves[stack[-1]] += count
+            report["hot_stage_profile"] = {
+                "samples": total,
+                "interval_seconds": self.interval,
+                "top_frames": [
+                    {"frame": frame, "samples": count, "share": round(count / total, 3)}
+                    for frame, count in leaves.most_common(TOP_FRAMES)
+                ],
+                "top_stacks": [
+                    {"stack": list(stack), "samples": count, "share": round(count / total, 3)}
+                    for stack, count in samples.most_common(TOP_STACKS)
+                ],
+            }
+        return report
+
+    def write_report(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        print(f"性能报告已写入 {path}")
+
+    def print_summary(self):
+        report = self.report()
+        print(f"\n各阶段耗时 (总用时 {report['elapsed_seconds']:.1f} 秒, 峰值内存 {report['peak_rss_bytes'] / 2**20:.0f} MiB):")
+        print(f"  {'阶段':<16}{'墙钟(秒)':>10}{'CPU(秒)':>10}{'条数':>10}{'条/秒':>10}{'占比':>8}{'峰值RSS(MiB)':>14}")
+        for name, stats in report["stages"].items():
+            rate = f"{stats['items_per_second']:.1f}" if stats["items_per_second"] else "-"
+            share = f"{stats['utilization']:.0%}" if stats["utilization"] is not None else "-"
+            rss = f"{stats['peak_rss_bytes'] / 2**20:.0f}" if stats["peak_rss_bytes"] else "-"
+            print(f"  {name:<16}{stats['wall_seconds']:>10.2f}{stats['cpu_seconds']:>10.2f}"
+                  f"{stats['items'] or '-':>10}{rate:>10}{share:>8}{rss:>14}")
+        hot = report.get("hot_stage_profile")
+        if hot:
+            print(f"最耗时阶段 {report['hottest_stage']} 的热点函数 ({hot['samples']} 次采样):")
+            for entry in hot["top_frames"][:5]:
+                print(f"  {entry['share']:>6.1%}  {entry['frame']}")
+
+
+@contextmanager
+def _noop():
+    yield _Span()
+
+
+def profile_stage(name, items=0):
+    """记录一个阶段的运行时间，没有启用剖析时为空操作"""
+    profiler = _active
+    if profiler is None:
+        return _noop()
+    return profiler.stage(name, items)
+
+
+def import_profiler(report_path=None, stacks=False):
+    """导入脚本使用: 指定了报告路径或 stacks 时返回 StageProfiler，否则返回空的上下文"""
+    if not report_path and not stacks:
+        return _noop()
+    return StageProfiler(report_path, stacks)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+增量JSON解析
+按块读取文件，逐个产出顶层数组(或包装字段中的数组)里的元素，
+峰值内存只与单个元素大小有关，与文件大小无关。
+格式错误时抛出ValueError，错误信息中包含出错位置在文件中的字符偏移。
+"""
+
+import json
+
+WHITESPACE = " \t\r\n"
+# 合法JSON中一个值之后只可能出现的字符
+DELIMITERS = ",]}:" + WHITESPACE
+
+
+class JsonStreamReader:
+    """基于 json.JSONDecoder.raw_decode 的流式读取器"""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        # 已从缓冲区丢弃的字符数，加上pos即为在文件中的偏移
+        self.consumed = 0
+        self.eof = False
+
+    @property
+    def offset(self):
+        return self.consumed + self.pos
+
+    def _fill(self):
+        """读取下一块数据，丢弃已解析的部分；文件结束时返回False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白并返回下一个字符(不消费)，文件结束时返回空字符串"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"JSON格式错误: 期望 '{ch}'，实际为 '{found or '文件结尾'}' (字符偏移 {self.offset})")
+        self.pos += 1
+
+    def read_value(self):
+        """解析下一个完整的JSON值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ValueError(f"JSON格式错误: {e.msg} (字符偏移 {self.consumed + e.pos})") from e
+            # 数字可能在缓冲区末尾被截断(如 "1." 或 "1e")，此时其后不是分隔符，继续读取后重新解析
+            truncated = end == len(self.buffer) or self.buffer[end] not in DELIMITERS
+            if truncated and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """逐个产出数组中的元素"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON格式错误: 数组元素之间期望 ','，实际为 '{separator or '文件结尾'}' (字符偏移 {self.offset - 1})")
+
+    def iter_object_keys(self):
+        """逐个产出对象的键，调用方需在下一次迭代前读取或跳过对应的值"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON格式错误: 对象成员之间期望 ','，实际为 '{separator or '文件结尾'}' (字符偏移 {self.offset - 1})")
+
+
+def iter_json_objects(path, wrapper_fields=()):
+    """
+    流式产出JSON文件中的对象:
+      - 顶层为数组: 逐个产出数组中的对象
+      - 顶层为对象: 产出第一个出现的包装字段(如 items/data)数组中的对象；
+        没有包装字段数组时产出整个对象
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = JsonStreamReader(f)
+        first = reader.peek()
+
+        if first == "[":
+            for item in reader.iter_array():
+                if isinstance(item, dict):
+                    yield item
+            return
+
+        if first != "{":
+            raise ValueError("JSON文件的顶层必须是数组或对象")
+
+        fields = {}
+        streamed = False
+        for key in reader.iter_object_keys():
+            if not streamed and key in wrapper_fields and reader.peek() == "[":
+                streamed = True
+                for item in reader.iter_array():
+                    if isinstance(item, dict):
+                        yield item
+            else:
+                fields[key] = reader.read_value()
+
+        if not streamed:
+            yield fields
@@ -1,94 +1,46 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
 import argparse
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
-import uuid
-from tqdm import tqdm
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import PROFILES, collection_config
+from embedding_backend import BACKENDS, MODEL_NAME, get_backend
+from embed_pool import ProcessEmbeddingPool, create_encoder
+from json_stream import iter_json_objects
+from import_manifest import ImportManifest, content_id
+from chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, TokenChunker, chunk_items
+from import_profile import import_profiler, profile_stage
+from payload_index import auto_index, parse_fields
+# qdrant_client 和 numpy 在用到时才导入，参数错误和帮助信息可以立即返回
+
+# 顶层为对象时，按这些字段名查找包含文档的数组
+ARRAY_FIELDS = ["items", "data", "documents", "entries", "results", "records"]
 
 def load_data_from_json(json_path, text_field=None):
-    """从普通JSON文件加载数据"""
+    """从普通JSON文件增量加载数据，返回文档生成器，文件格式错误时抛出ValueError(包含字符偏移)"""
     print(f"正在从 {json_path} 加载数据...")
     
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        documents = []
-        
-        # 处理JSON数组
-        if isinstance(data, list):
-            for item in data:
-                if isinstance(item, dict):
-                    # 如果指定了text_field且该字段存在
-                    if text_field and text_field in item:
-                        text_content = item[text_field]
-                    # 如果没有指定text_field或字段不存在，则自动生成描述
-                    else:
-                        # 自动生成描述文本
-                        text_content = generate_description(item)
-                    
-                    doc = {
-                        "text": text_content,
-                        "metadata": {}
-                    }
-                    # 将所有字段作为元数据
-                    for key, value in item.items():
-                        if key != text_field:  # 如果有text_field，就不再重复添加
-                            doc["metadata"][key] = value
-                    documents.append(doc)
-        
-        # 处理包含items/data数组的JSON对象
-        elif isinstance(data, dict):
-            # 尝试常见的数组字段名
-            array_fields = ["items", "data", "documents", "entries", "results", "records"]
-            found_array = False
-            
-            for field in array_fields:
-                if field in data and isinstance(data[field], list):
-                    found_array = True
-                    for item in data[field]:
-                        if isinstance(item, dict):
-                            # 如果指定了text_field且该字段存在
-                            if text_field and text_field in item:
-                                text_content = item[text_field]
-                            # 如果没有指定text_field或字段不存在，则自动生成描述
-                            else:
-                                text_content = generate_description(item)
-                            
-                            doc = {
-                                "text": text_content,
-                                "metadata": {}
-                            }
-                            # 将所有字段作为元数据
-                            for key, value in item.items():
-                                if key != text_field:  # 如果有text_field，就不再重复添加
-                                    doc["metadata"][key] = value
-                            documents.append(doc)
-                    break
-            
-            # 如果没有找到数组，但整个对象有价值，则直接处理这个对象
-            if not found_array:
-                if text_field and text_field in data:
-                    text_content = data[text_field]
-                else:
-                    text_content = generate_description(data)
-                
-                doc = {
-                    "text": text_content,
-                    "metadata": {}
-                }
-                for key, value in data.items():
-                    if key != text_field:
-                        doc["metadata"][key] = value
-                documents.append(doc)
-        
-        print(f"成功加载了 {len(documents)} 条数据")
-        return documents
-    except Exception as e:
-        print(f"加载JSON数据时出错: {str(e)}")
-        return []
+    count = 0
+    # 顶层数组、包装字段中的数组或单个对象，逐个产出，不把整个文件读入内存
+    for item in iter_json_objects(json_path, ARRAY_FIELDS):
+        yield make_document(item, text_field)
+        count += 1
+    print(f"成功加载了 {count} 条数据")
+
+def make_document(item, text_field=None):
+    """将JSON对象转换为文档"""
+    # 如果指定了text_field且该字段存在
+    if text_field and text_field in item:
+        text_content = item[text_field]
+    # 如果没有指定text_field或字段不存在，则自动生成描述
+    else:
+        with profile_stage("describe", 1):
+            text_content = generate_description(item)
+    
+    # 将所有字段作为元数据，如果有text_field，就不再重复添加
+    metadata = {key: value for key, value in item.items() if key != text_field}
+    return {"text": text_content, "metadata": metadata}
 
 def generate_description(item):
     """为JSON对象自动生成描述文本"""
@@ -133,66 +85,112 @@ def generate_description(item):
         # 返回前200个字符的JSON文本作为描述
         return json.dumps(item, ensure_ascii=False)[:500]
 
-def import_to_qdrant(documents, collection_name="knowledge_base", host="localhost", port=6333):
-    """将文档导入到Qdrant"""
+def import_to_qdrant(documents, collection_name="knowledge_base", host="localhost", port=6333, profile=None, backend=None, batch_size=64, workers=1, full=False, prune=False, chunker=None, export=None, index_fields=None, skip_index_fields=None, auto_indexes=True):
+    """
+    将文档(列表或生成器)导入到Qdrant，返回处理的条数(含跳过的未变化文档)。
+    export 指定时只编码并写入向量文件(Parquet)，不连接Qdrant，之后用 bulk_load.py 加载。
+    上传之前按输入样本建立payload索引: index_fields 为总是建立索引的 {字段: 类型}，
+    skip_index_fields 中的字段不建索引，auto_indexes=False 时只建立 index_fields
+    """
     if not documents:
         print("没有数据可导入")
-        return
+        return 0
     
-    print(f"正在连接到 Qdrant ({host}:{port})...")
-    client = QdrantClient(host=host, port=port)
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+        from embedding_cache import cached_encoder
+        from sparse_encoder import has_sparse_vectors
+        from import_pipeline import ImportPipeline, document_items
+        from vector_export import ParquetExporter
+    
+    client = None
+    if not export:
+        print(f"正在连接到 Qdrant ({host}:{port})...")
+        client = QdrantClient(host=host, port=port)
     
     # 加载嵌入模型
     print("正在加载嵌入模型...")
     model_name = "fast-paraphrase-multilingual-minilm-l12-v2"  # 修改为与错误消息中一致的向量名称
-    model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")  # 实际模型名称不变
+    with profile_stage("load_model"), startup_phase("加载模型"):
+        model = create_encoder(backend, workers, MODEL_NAME)  # 实际模型名称不变
     vector_size = model.get_sentence_embedding_dimension()
     
-    # 检查集合是否存在，不存在则创建
-    collections = client.get_collections().collections
-    collection_names = [collection.name for collection in collections]
-    
-    if collection_name not in collection_names:
-        print(f"正在创建集合 {collection_name}...")
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                model_name: {  # 使用命名向量格式
-                    "size": vector_size,
-                    "distance": "Cosine"
-                }
-            }
-        )
-    
-    # 准备批量导入的数据
-    print("正在生成嵌入向量...")
-    points = []
-    
-    for doc in tqdm(documents):
-        text = doc["text"]
-        embedding = model.encode(text).tolist()
-        point_id = str(uuid.uuid4())
+    exporter = None
+    manifest = None
+    if export:
+        # 导出文件总是包含稀疏向量，加载时按目标集合的配置决定是否写入
+        with_sparse = True
+        exporter = ParquetExporter(export, vector_size, vector_name=model_name, with_sparse=True,
+                                   model_name=MODEL_NAME, backend=get_backend(backend))
+    else:
+        # 检查集合是否存在，不存在则创建(第一次请求时建立连接)
+        with startup_phase("连接Qdrant"):
+            collections = client.get_collections().collections
+        collection_names = [collection.name for collection in collections]
         
-        payload = doc.get("metadata", {})
-        payload["text"] = text
+        if collection_name not in collection_names:
+            print(f"正在创建集合 {collection_name}...")
+            client.create_collection(
+                collection_name=collection_name,
+                **collection_config(vector_size, profile, vector_name=model_name, sparse=True)  # 使用命名向量格式
+            )
         
-        points.append({
-            "id": point_id,
-            "vector": {model_name: embedding},  # 使用命名向量格式
-            "payload": payload
-        })
-    
-    # 批量导入数据
-    print(f"正在导入 {len(points)} 个点到 Qdrant...")
-    batch_size = 100
-    for i in tqdm(range(0, len(points), batch_size)):
-        batch = points[i:i+batch_size]
-        client.upsert(
-            collection_name=collection_name,
-            points=batch
-        )
-    
-    print(f"成功导入了 {len(points)} 条数据到 {collection_name} 集合")
+        # 集合配置了稀疏向量时同时写入BM25稀疏向量，用于混合检索
+        with_sparse = has_sparse_vectors(client.get_collection(collection_name))
+        
+        # 增量导入清单: 点ID由内容哈希派生，未变化的文档直接跳过
+        manifest = ImportManifest(collection_name, host, port)
+        manifest.sync_with_collection(client, collection_name)
+    
+    print_startup_timing()
+    # 读取、编码、上传并行进行
+    print(f"正在生成嵌入向量并{'导出到 ' + export if export else '导入到 Qdrant'}...")
+    encoder = cached_encoder(model, MODEL_NAME, get_backend(backend))
+    pipeline = ImportPipeline(
+        encoder, exporter or client, collection_name,
+        vector_name=model_name,  # 使用命名向量格式
+        with_sparse=with_sparse,
+        encode_batch_size=batch_size * max(1, workers),
+        id_fn=content_id,
+        manifest=manifest,
+        skip_imported=not full
+    )
+    try:
+        items = document_items(documents)
+        if client is not None:
+            # 在上传之前建立过滤字段的索引，之后写入的点直接进入索引
+            with profile_stage("index"):
+                items = auto_index(client, collection_name, items, index_fields, skip_index_fields, auto_indexes)
+        if chunker is not None:
+            # 长文档切分为重叠窗口，每个窗口单独成点
+            items = chunk_items(items, chunker)
+        count = pipeline.run(items)
+    except BaseException:
+        if exporter is not None:
+            exporter.abort()
+        raise
+    finally:
+        if hasattr(encoder, "print_cache_stats"):
+            encoder.print_cache_stats()
+        if isinstance(model, ProcessEmbeddingPool):
+            model.print_stats()
+            model.close()
+    
+    if exporter is not None:
+        exporter.close()
+        print(f"成功导出了 {count} 条数据到 {export}")
+        return count
+    
+    if count:
+        print(f"成功导入了 {count} 条数据到 {collection_name} 集合")
+
+    # 删除本次输入中已不存在(或内容已变化)的旧文档
+    if prune:
+        with profile_stage("prune"):
+            removed = manifest.prune(client, collection_name)
+        print(f"已删除 {removed} 条输入中不再存在的文档")
+    manifest.close()
+    return count + pipeline.skipped
 
 def main():
     parser = argparse.ArgumentParser(description="从普通JSON文件导入数据到Qdrant向量数据库")
@@ -201,16 +199,59 @@ def main():
     parser.add_argument("--host", type=str, default="localhost", help="Qdrant服务器主机名")
     parser.add_argument("--port", type=int, default=6333, help="Qdrant服务器端口")
     parser.add_argument("--collection", type=str, default="knowledge_base", help="Qdrant集合名称")
+    parser.add_argument("--profile", type=str, choices=list(PROFILES),
+                        help="新建集合时使用的性能配置 (默认读取环境变量QDRANT_PROFILE)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS,
+                        help="嵌入模型后端 (默认读取环境变量EMBED_BACKEND)")
+    parser.add_argument("--batch_size", type=int, default=64, help="每次编码的文档数 (多进程时为每个进程)")
+    parser.add_argument("--workers", type=int, default=1, help="嵌入进程数，大于1时每个进程加载一份模型并行编码")
+    parser.add_argument("--full", action="store_true", help="重新导入所有文档，不跳过已导入的文档")
+    parser.add_argument("--prune", action="store_true", help="导入后删除集合中输入里已不存在的文档")
+    parser.add_argument("--export", type=str, help="只编码并写入向量文件(.parquet)，不连接Qdrant，之后用bulk_load.py加载")
+    parser.add_argument("--chunk", action="store_true", help="将超过模型长度的文档切分为重叠窗口分别导入")
+    parser.add_argument("--chunk_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="每个窗口的token数")
+    parser.add_argument("--chunk_overlap", type=int, default=DEFAULT_OVERLAP, help="相邻窗口重叠的token数")
+    parser.add_argument("--index_fields", type=str, help="总是建立payload索引的字段，逗号分隔，可指定类型(如 brand,year:integer)")
+    parser.add_argument("--skip_index_fields", type=str, help="不建立payload索引的字段，逗号分隔")
+    parser.add_argument("--no_auto_index", action="store_true", help="不按输入样本自动建立payload索引")
+    parser.add_argument("--report", type=str, help="输出各阶段耗时、吞吐量和峰值内存，并写入JSON报告(如 import_report.json)")
+    parser.add_argument("--report_stacks", action="store_true", help="同时采样调用栈，报告最耗时阶段的热点函数")
     
     args = parser.parse_args()
     
-    # 加载数据
+    if not os.path.exists(args.file):
+        print(f"文件不存在: {args.file}")
+        return
+    
+    if args.prune and args.export:
+        print("--prune 不能与 --export 同时使用")
+        return
+    
+    # 加载数据(生成器，边解析边编码上传)
     documents = load_data_from_json(args.file, args.text_field)
     
-    # 导入到Qdrant
-    if documents:
-        import_to_qdrant(documents, args.collection, args.host, args.port)
-    else:
+    try:
+        chunker = TokenChunker(args.chunk_tokens, args.chunk_overlap) if args.chunk else None
+    except ValueError as e:
+        print(f"分块参数无效: {e}")
+        return
+    
+    try:
+        index_fields = parse_fields(args.index_fields)
+        skip_index_fields = set(parse_fields(args.skip_index_fields))
+    except ValueError as e:
+        print(f"索引字段无效: {e}")
+        return
+    
+    # 导入到Qdrant；JSON读取出错时整个导入中止(不输出成功信息，也不执行 --prune)，以非零状态退出
+    try:
+        with import_profiler(args.report, args.report_stacks):
+            count = import_to_qdrant(documents, args.collection, args.host, args.port, args.profile, args.backend, args.batch_size, args.workers, args.full, args.prune, chunker, args.export,
+                                     index_fields, skip_index_fields, not args.no_auto_index)
+    except (OSError, ValueError) as e:
+        print(f"读取或导入JSON文件失败: {e}")
+        sys.exit(1)
+    if not count:
         print("没有找到可导入的数据，请检查JSON文件格式")
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+导入时自动建立payload索引
+没有索引的payload字段在过滤搜索时只能逐点扫描，数据越多越慢。
+导入脚本在上传之前先读取输入的前若干条文档，统计每个字段的值类型和基数，
+为适合过滤的字段创建索引(之后上传的点会直接写入索引):
+
+  - 字符串或字符串数组，值较短(不是自由文本)且不同值的比例不高(不是ID) -> keyword
+  - 整数 -> integer，整数与小数混合 -> float，布尔 -> bool
+  - 嵌套对象、类型混杂的字段以及正文字段不建索引
+
+环境变量 IMPORT_INDEX_SAMPLE 指定采样条数 (默认 1000)
+"""
+
+import os
+import itertools
+from collections import Counter
+
+SAMPLE_SIZE = int(os.getenv("IMPORT_INDEX_SAMPLE", "1000"))
+
+# 正文和分块信息不作为过滤字段；parent_id 几乎每个父文档都不同，样本较少时基数判断不可靠，直接排除
+DEFAULT_EXCLUDED = {"text", "content", "import_date", "parent_id", "chunk_index", "chunk_count"}
+
+# 字符串字段: 平均长度或平均词数超过该值视为自由文本
+MAX_KEYWORD_LENGTH = 64
+MAX_KEYWORD_WORDS = 3
+# 字符串字段: 不同值占比超过该值视为ID类字段，样本文档数太少时不判断
+MAX_DISTINCT_RATIO = 0.5
+MIN_RATIO_SAMPLES = 100
+# 每个字段最多记录的不同值数量
+MAX_TRACKED_VALUES = 10000
+
+# 可以推断的索引类型，与 PayloadSchemaType 的取值一致
+SCHEMA_TYPES = ("keyword", "integer", "float", "bool")
+
+
+def _value_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "keyword"
+    return None
+
+
+class FieldStats:
+    """一个payload字段在样本中的类型与取值统计"""
+
+    def __init__(self):
+        self.documents = 0
+        self.values = 0
+        self.types = Counter()
+        self.distinct = set()
+        self.total_length = 0
+        self.total_words = 0
+
+    def observe(self, value):
+        self.documents += 1
+        for item in (value if isinstance(value, list) else [value]):
+            if item is None:
+                continue
+            kind = _value_type(item)
+            self.types[kind or "other"] += 1
+            if kind is None:
+                continue
+            self.values += 1
+            if isinstance(item, str):
+                self.total_length += len(item)
+                self.total_words += len(item.split())
+            if len(self.distinct) < MAX_TRACKED_VALUES:
+                self.distinct.add(item)
+
+    def infer(self):
+        """推断索引类型(keyword/integer/float/bool)，不适合建索引时返回None"""
+        if not self.values or self.types.get("other"):
+            return None
+        kinds = set(self.types)
+        if kinds == {"keyword"}:
+            if self.total_length / self.values > MAX_KEYWORD_LENGTH or self.total_words / self.values > MAX_KEYWORD_WORDS:
+                return None
+            if self.documents >= MIN_RATIO_SAMPLES and len(self.distinct) / self.values > MAX_DISTINCT_RATIO:
+                return None
+            return "keyword"
+        if kinds == {"bool"}:
+            return "bool"
+        if kinds == {"integer"}:
+            return "integer"
+        if kinds <= {"integer", "float"}:
+            return "float"
+        return None
+
+
+def profile_payloads(payloads):
+    """统计每个顶层字段，返回 {字段: FieldStats}"""
+    fields = {}
+    for payload in payloads:
+        for key, value in payload.items():
+            fields.setdefault(key, FieldStats()).observe(value)
+    return fields
+
+
+def parse_fields(spec):
+    """解析 "brand,year:integer" 形式的字段列表，返回 {字段: 类型或None}"""
+    fields = {}
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, kind = entry.partition(":")
+        kind = kind.strip().lower() or None
+        if kind is not None and kind not in SCHEMA_TYPES:
+            raise ValueError(f"未知的索引类型: {kind}，可选: {', '.join(SCHEMA_TYPES)}")
+        fields[name.strip()] = kind
+    return fields
+
+
+def plan_indexes(payloads, include=None, exclude=None, auto=True):
+    """
+    根据样本决定要建立的索引，返回 {字段: 类型}。
+    include 中的字段总是建立索引(未指定类型时按样本推断，推断不出时用keyword)，
+    exclude 中的字段不建索引，auto=False 时只建立 include 中的字段
+    """
+    include = include or {}
+    excluded = DEFAULT_EXCLUDED | set(exclude or ())
+    stats = profile_payloads(payloads)
+
+    plan = {}
+    if auto:
+        for name, field in stats.items():
+            if name in excluded:
+                continue
+            kind = field.infer()
+            if kind is not None:
+                plan[name] = kind
+    for name, kind in include.items():
+        plan[name] = kind or (stats[name].infer() if name in stats else None) or "keyword"
+    return plan
+
+
+def create_indexes(client, collection_name, plan):
+    """创建计划中的索引，已存在的字段跳过，返回新建的字段"""
+    from qdrant_client.http.models import PayloadSchemaType
+
+    existing = set((client.get_collection(collection_name).payload_schema or {}).keys())
+    created = []
+    for name, kind in plan.items():
+        if name in existing:
+            continue
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=name,
+            field_schema=PayloadSchemaType(kind),
+            wait=True
+        )
+        created.append(name)
+        print(f"创建了payload索引: {collection_name}.{name} ({kind})")
+    return created
+
+
+def sample_items(items, sample_size=SAMPLE_SIZE):
+    """取出前 sample_size 条输入作为样本，返回 (样本, 包含样本在内的完整输入)"""
+    items = iter(items)
+    sample = list(itertools.islice(items, sample_size))
+    return sample, itertools.chain(sample, items)
+
+
+def auto_index(client, collection_name, items, include=None, exclude=None, auto=True, sample_size=SAMPLE_SIZE):
+    """
+    对流水线输入的 (text, payload) 采样并在上传之前建立payload索引，
+    返回可继续使用的完整输入
+    """
+    if not auto and not include:
+        return items
+    sample, items = sample_items(items, sample_size)
+    plan = plan_indexes((payload for _, payload in sample), include, exclude, auto)
+    if plan:
+        create_indexes(client, collection_name, plan)
+    return items
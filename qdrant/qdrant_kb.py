@@ -2,8 +2,10 @@
 """
 基于Qdrant向量数据库的知识库系统
 使用方法: 
-  - 导入数据: python qdrant_kb.py import kb/sample_kb_data.json
+  - 导入数据: python qdrant_kb.py import kb/sample_kb_data.json [--workers N] [--full] [--prune] [--chunk] [--export 文件.parquet] [--report 报告.json] [--report_stacks] [--no_auto_index]
   - 搜索知识库: python qdrant_kb.py search "您的查询"
+  - 集合性能配置: 设置环境变量 QDRANT_PROFILE (default, fast, low_memory, high_recall)
+  - 嵌入后端: 设置环境变量 EMBED_BACKEND (torch, onnx, onnx-int8)
 """
 
 import sys
@@ -11,10 +13,16 @@ import os
 import json
 import csv
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from qdrant_client.http.models import Distance, VectorParams, PointStruct
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import collection_config, search_params
+from embedding_backend import MODEL_NAME, get_backend
+from embed_pool import ProcessEmbeddingPool, create_encoder
+from json_stream import iter_json_objects
+from import_manifest import ImportManifest, content_id
+from chunker import CHUNK_FETCH_FACTOR, TokenChunker, collapse_chunks, split_document
+from import_profile import import_profiler, profile_stage
+from payload_index import auto_index
+# qdrant_client、numpy 和模型在用到时才导入，帮助和参数错误可以立即返回
 
 # 配置
 COLLECTION_NAME = "knowledge_base"
@@ -26,6 +34,9 @@ SAMPLE_CSV_FILE = os.path.join(os.path.dirname(__file__), "sample_kb_data.csv")
 
 def initialize_client():
     """初始化Qdrant客户端"""
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+    
     # 使用本地存储
     # client = QdrantClient(path="./qdrant_data")
     
@@ -34,141 +45,136 @@ def initialize_client():
     
     return client
 
-def initialize_model():
-    """初始化语义模型"""
+def initialize_model(workers=1):
+    """初始化语义模型，workers > 1 时启动多进程嵌入池，外层使用磁盘嵌入缓存"""
     try:
-        print(f"正在加载语义模型...")
-        model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+        print(f"正在加载语义模型 (后端: {get_backend()})...")
+        with profile_stage("load_model"), startup_phase("加载模型"):
+            from embedding_cache import cached_encoder
+            model = create_encoder(workers=workers)
         print(f"模型加载完成")
-        return model
+        return cached_encoder(model, MODEL_NAME, get_backend())
     except Exception as e:
         print(f"加载模型失败: {e}")
         sys.exit(1)
 
-def create_collection_if_not_exists(client):
+def initialize_search_model():
+    """搜索使用的模型: 嵌入守护进程在运行时通过socket编码，否则在本进程加载"""
+    with startup_phase("连接嵌入守护进程"):
+        from embed_daemon import connect_daemon
+        encoder = connect_daemon(MODEL_NAME, get_backend())
+    if encoder is not None:
+        print(f"使用嵌入守护进程 (进程 {encoder.info['pid']})")
+        return encoder
+    return initialize_model()
+
+def create_collection_if_not_exists(client, profile=None):
     """创建Qdrant集合，如果不存在"""
-    collections = client.get_collections().collections
+    with startup_phase("连接Qdrant"):
+        collections = client.get_collections().collections
     collection_names = [collection.name for collection in collections]
     
     if COLLECTION_NAME not in collection_names:
         print(f"创建集合 '{COLLECTION_NAME}'...")
         client.create_collection(
             collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(
-                size=VECTOR_SIZE,
-                distance=Distance.COSINE
-            )
+            **collection_config(VECTOR_SIZE, profile, sparse=True)
         )
         print(f"集合 '{COLLECTION_NAME}' 创建成功")
     else:
         print(f"集合 '{COLLECTION_NAME}' 已存在")
 
-def import_json_file(file_path, model, client):
-    """从JSON文件导入数据"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        if isinstance(data, list):
-            documents = data
-        else:
-            documents = [data]
-            
-        print(f"从 {file_path} 中读取了 {len(documents)} 条文档")
-        
-        # 准备批量导入的点
-        points = []
+def kb_items(documents, chunker=None):
+    """将知识库文档转换为流水线输入的 (text, payload)，指定分块器时长内容切分为重叠窗口"""
+    for doc in documents:
+        # 处理标签（CSV中为逗号分隔的字符串）
+        if 'tags' in doc and isinstance(doc['tags'], str):
+            doc['tags'] = [tag.strip() for tag in doc['tags'].split(',')]
         
-        for i, doc in enumerate(documents):
-            # 组合标题和内容以创建更丰富的嵌入
-            text_for_embedding = f"{doc.get('title', '')} {doc.get('content', '')}"
-            # 生成向量嵌入
-            embedding = model.encode(text_for_embedding).tolist()
-            
-            # 添加导入日期
-            doc['import_date'] = datetime.now().isoformat()
-            
-            # 创建点
-            point = PointStruct(
-                id=i,
-                vector=embedding,
-                payload=doc
-            )
-            points.append(point)
+        # 添加导入日期
+        doc['import_date'] = datetime.now().isoformat()
         
-        # 批量上传到Qdrant
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
+        # 组合标题和内容以创建更丰富的嵌入
+        if chunker is not None:
+            # 每个窗口都带上标题，payload中的content替换为窗口文本
+            yield from split_document(doc.get('content', ''), doc, chunker, 'content', prefix=f"{doc.get('title', '')} ")
+        else:
+            yield f"{doc.get('title', '')} {doc.get('content', '')}", doc
+
+def describe_target(client):
+    """导入目标的描述: 集合或导出文件"""
+    if hasattr(client, "write_batch"):
+        return client.path
+    return f"'{COLLECTION_NAME}' 集合"
+
+def import_documents(documents, model, client, manifest=None, full=False, chunker=None, auto_indexes=True):
+    """
+    通过流水线编码并分块上传文档，点ID由内容哈希派生，未变化的文档直接跳过。
+    client 为 ParquetExporter 时写入向量文件(总是包含稀疏向量)，
+    auto_indexes=True 时上传之前按输入样本建立payload索引
+    """
+    from sparse_encoder import has_sparse_vectors
+    from import_pipeline import ImportPipeline
+    
+    exporting = hasattr(client, "write_batch")
+    pipeline = ImportPipeline(
+        model, client, COLLECTION_NAME,
+        with_sparse=exporting or has_sparse_vectors(client.get_collection(COLLECTION_NAME)),
+        encode_batch_size=64 * getattr(model, "workers", 1),
+        id_fn=content_id,
+        manifest=manifest,
+        skip_imported=not full
+    )
+    items = kb_items(documents, chunker)
+    if auto_indexes and not exporting:
+        # 按输入样本为过滤字段(如 category、tags)建立payload索引
+        with profile_stage("index"):
+            items = auto_index(client, COLLECTION_NAME, items)
+    return pipeline.run(items)
+
+def import_json_file(file_path, model, client, manifest=None, full=False, chunker=None, auto_indexes=True):
+    """从JSON文件导入数据"""
+    try:
+        # 顶层为数组时逐个解析元素，为对象时作为单条文档
+        documents = iter_json_objects(file_path)
+        count = import_documents(documents, model, client, manifest, full, chunker, auto_indexes)
         
-        print(f"成功导入 {len(points)} 条文档到 '{COLLECTION_NAME}' 集合")
-        return len(points)
+        print(f"成功导入 {count} 条文档到 {describe_target(client)}")
+        return count
     
     except Exception as e:
         print(f"读取或导入JSON文件失败: {e}")
         sys.exit(1)
 
-def import_csv_file(file_path, model, client):
+def import_csv_file(file_path, model, client, manifest=None, full=False, chunker=None, auto_indexes=True):
     """从CSV文件导入数据"""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
+            # 逐行读取，边读边编码上传
             reader = csv.DictReader(f)
-            documents = list(reader)
-        
-        print(f"从 {file_path} 中读取了 {len(documents)} 条文档")
-        
-        # 准备批量导入的点
-        points = []
-        
-        for i, doc in enumerate(documents):
-            # 处理标签（如果是逗号分隔的字符串）
-            if 'tags' in doc and isinstance(doc['tags'], str):
-                doc['tags'] = [tag.strip() for tag in doc['tags'].split(',')]
-            
-            # 组合标题和内容以创建更丰富的嵌入
-            text_for_embedding = f"{doc.get('title', '')} {doc.get('content', '')}"
-            
-            # 生成向量嵌入
-            embedding = model.encode(text_for_embedding).tolist()
-            
-            # 添加导入日期
-            doc['import_date'] = datetime.now().isoformat()
-            
-            # 创建点
-            point = PointStruct(
-                id=i,
-                vector=embedding,
-                payload=doc
-            )
-            points.append(point)
-        
-        # 批量上传到Qdrant
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
+            count = import_documents(reader, model, client, manifest, full, chunker, auto_indexes)
         
-        print(f"成功导入 {len(points)} 条文档到 '{COLLECTION_NAME}' 集合")
-        return len(points)
+        print(f"成功导入 {count} 条文档到 {describe_target(client)}")
+        return count
     
     except Exception as e:
         print(f"读取或导入CSV文件失败: {e}")
         sys.exit(1)
 
-def search_knowledge_base(query, model, client, limit=10):
+def search_knowledge_base(query, model, client, limit=10, profile=None):
     """执行语义搜索"""
-    # 为查询生成向量嵌入
-    query_vector = model.encode(query).tolist()
+    # 为查询生成向量嵌入(float32数组直接交给客户端，由客户端转换为请求格式)
+    query_vector = model.encode(query)
     
-    # 执行搜索
-    search_result = client.search(
+    # 执行搜索(多取一些候选，同一文档的多个窗口只保留得分最高的一个)
+    search_result = client.query_points(
         collection_name=COLLECTION_NAME,
-        query_vector=query_vector,
-        limit=limit
-    )
+        query=query_vector,
+        limit=limit * CHUNK_FETCH_FACTOR,
+        search_params=search_params(profile)
+    ).points
     
-    return search_result
+    return collapse_chunks(search_result, limit)
 
 def format_results(results):
     """格式化搜索结果以便显示"""
@@ -210,29 +216,83 @@ def format_results(results):
     
     return "\n".join(formatted)
 
-def import_data(file_path):
-    """导入数据到知识库"""
+def import_data(file_path, workers=1, full=False, prune=False, chunk=False, export=None, auto_indexes=True):
+    """
+    导入数据到知识库
+    full=True 时不跳过已导入的文档，prune=True 时删除输入中已不存在的文档，
+    chunk=True 时将超过模型长度的内容切分为重叠窗口，
+    export 指定时只编码并写入向量文件，不连接Qdrant，
+    auto_indexes=False 时不自动建立payload索引
+    """
+    # 先检查文件类型，避免无谓地加载模型
+    _, ext = os.path.splitext(file_path)
+    if ext.lower() not in ('.json', '.csv'):
+        print(f"不支持的文件类型: {ext}. 请使用 .json 或 .csv 文件")
+        sys.exit(1)
+    
+    chunker = TokenChunker() if chunk else None
+    
+    if export:
+        with startup_phase("导入模块"):
+            from vector_export import ParquetExporter
+        model = initialize_model(workers)
+        print_startup_timing()
+        exporter = ParquetExporter(export, model.get_sentence_embedding_dimension(), with_sparse=True,
+                                   model_name=MODEL_NAME, backend=get_backend())
+        try:
+            if ext.lower() == '.json':
+                import_json_file(file_path, model, exporter, chunker=chunker)
+            else:
+                import_csv_file(file_path, model, exporter, chunker=chunker)
+        except BaseException:
+            exporter.abort()
+            raise
+        finally:
+            close_model(model)
+        exporter.close()
+        return
+    
     client = initialize_client()
-    model = initialize_model()
+    model = initialize_model(workers)
     create_collection_if_not_exists(client)
     
+    # 增量导入清单
+    manifest = ImportManifest(COLLECTION_NAME)
+    manifest.sync_with_collection(client, COLLECTION_NAME)
+    print_startup_timing()
+    
     # 根据文件扩展名导入数据
-    _, ext = os.path.splitext(file_path)
-    if ext.lower() == '.json':
-        import_json_file(file_path, model, client)
-    elif ext.lower() == '.csv':
-        import_csv_file(file_path, model, client)
-    else:
-        print(f"不支持的文件类型: {ext}. 请使用 .json 或 .csv 文件")
-        sys.exit(1)
+    try:
+        if ext.lower() == '.json':
+            import_json_file(file_path, model, client, manifest, full, chunker, auto_indexes)
+        else:
+            import_csv_file(file_path, model, client, manifest, full, chunker, auto_indexes)
+        
+        if prune:
+            with profile_stage("prune"):
+                removed = manifest.prune(client, COLLECTION_NAME)
+            print(f"已删除 {removed} 条输入中不再存在的文档")
+    finally:
+        manifest.close()
+        close_model(model)
+
+def close_model(model):
+    """输出缓存统计，关闭多进程嵌入池"""
+    if hasattr(model, "print_cache_stats"):
+        model.print_cache_stats()
+    pool = getattr(model, "model", model)
+    if isinstance(pool, ProcessEmbeddingPool):
+        pool.print_stats()
+        pool.close()
 
 def search(query):
     """搜索知识库"""
     client = initialize_client()
-    model = initialize_model()
+    model = initialize_search_model()
     
     # 检查集合是否存在
-    collections = client.get_collections().collections
+    with startup_phase("连接Qdrant"):
+        collections = client.get_collections().collections
     collection_names = [collection.name for collection in collections]
     
     if COLLECTION_NAME not in collection_names:
@@ -240,6 +300,7 @@ def search(query):
         print(f"请先导入数据: python qdrant_kb.py import {SAMPLE_JSON_FILE}")
         sys.exit(1)
     
+    print_startup_timing()
     print(f"\n正在搜索: \"{query}\"...")
     results = search_knowledge_base(query, model, client)
     
@@ -249,13 +310,25 @@ def search(query):
 def print_usage():
     """打印使用帮助"""
     print("使用方法:")
-    print(f"  导入数据: python {sys.argv[0]} import [文件路径]")
+    print(f"  导入数据: python {sys.argv[0]} import [文件路径] [--workers N] [--full] [--prune] [--chunk] [--export 文件.parquet] [--report 报告.json] [--report_stacks] [--no_auto_index]")
     print(f"  搜索知识库: python {sys.argv[0]} search \"查询内容\"")
     print("")
     print("示例:")
     print(f"  python {sys.argv[0]} import {SAMPLE_JSON_FILE}")
     print(f"  python {sys.argv[0]} search \"Docker的优势是什么\"")
 
+def pop_option(args, flag):
+    """从参数列表中取出 flag 及其值，没有该参数时返回None"""
+    if flag not in args:
+        return None
+    i = args.index(flag)
+    if i + 1 >= len(args):
+        print(f"{flag} 需要一个文件路径参数")
+        sys.exit(1)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
 def main():
     """主函数"""
     if len(sys.argv) < 2:
@@ -265,17 +338,47 @@ def main():
     command = sys.argv[1].lower()
     
     if command == "import":
-        if len(sys.argv) != 3:
-            print(f"使用方法: python {sys.argv[0]} import [文件路径]")
+        args = sys.argv[2:]
+        workers = 1
+        if "--workers" in args:
+            i = args.index("--workers")
+            try:
+                workers = int(args[i + 1])
+            except (IndexError, ValueError):
+                print("--workers 需要一个整数参数")
+                sys.exit(1)
+            del args[i:i + 2]
+        
+        # --export: 只编码并写入向量文件，之后用 bulk_load.py 加载
+        export = pop_option(args, "--export")
+        # --report: 输出各阶段耗时并写入JSON报告; --report_stacks: 同时采样调用栈
+        report = pop_option(args, "--report")
+        
+        # --full: 重新导入所有文档; --prune: 删除输入中已不存在的文档; --chunk: 长文档分块
+        full = "--full" in args
+        prune = "--prune" in args
+        chunk = "--chunk" in args
+        report_stacks = "--report_stacks" in args
+        # --no_auto_index: 不自动建立payload索引
+        no_auto_index = "--no_auto_index" in args
+        args = [arg for arg in args if arg not in ("--full", "--prune", "--chunk", "--report_stacks", "--no_auto_index")]
+        
+        if len(args) != 1:
+            print(f"使用方法: python {sys.argv[0]} import [文件路径] [--workers N] [--full] [--prune] [--chunk] [--export 文件.parquet] [--report 报告.json] [--report_stacks] [--no_auto_index]")
             print(f"示例: python {sys.argv[0]} import {SAMPLE_JSON_FILE}")
             sys.exit(1)
         
-        file_path = sys.argv[2]
+        file_path = args[0]
         if not os.path.exists(file_path):
             print(f"文件不存在: {file_path}")
             sys.exit(1)
         
-        import_data(file_path)
+        if prune and export:
+            print("--prune 不能与 --export 同时使用")
+            sys.exit(1)
+        
+        with import_profiler(report, report_stacks):
+            import_data(file_path, workers, full, prune, chunk, export, not no_auto_index)
     
     elif command == "search":
         if len(sys.argv) < 3:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+查询缓存
+按字节数限制内存占用的 LRU/TTL 缓存，用于缓存查询向量与搜索结果。
+"""
+
+import json
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """规范化查询文本: 统一Unicode形式并合并空白字符"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def estimate_size(value):
+    """估算缓存值占用的字节数"""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        # numpy数组
+        return int(nbytes)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class LRUCache:
+    """按字节数和存活时间淘汰的LRU缓存"""
+
+    def __init__(self, max_bytes, ttl_seconds=None):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """命中时返回缓存值并移到最近使用位置，否则返回None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, _, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """写入缓存，超出字节上限时淘汰最久未使用的条目"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # 单个值超过上限，不缓存
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """返回命中/未命中计数与内存占用"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
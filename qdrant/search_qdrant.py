@@ -1,20 +1,29 @@
 import json
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from startup_timing import print_startup_timing, startup_phase
+from collection_profile import collection_config, search_params
+from embedding_backend import MODEL_NAME, get_backend
+from chunker import CHUNK_FETCH_FACTOR, collapse_chunks
 
 def main():
+    with startup_phase("导入模块"):
+        from qdrant_client import QdrantClient
+        from embed_daemon import load_encoder
+    
     # 连接到Qdrant服务器
     client = QdrantClient(url="http://localhost:6333")
     print("已连接到Qdrant服务器")
     
     # 加载嵌入模型
-    model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-    print(f"加载嵌入模型: {model_name}")
-    model = SentenceTransformer(model_name)
+    backend = get_backend()
+    print(f"加载嵌入模型: {MODEL_NAME} (后端: {backend})")
+    # 嵌入守护进程在运行时通过socket编码，否则在本进程加载模型(重复查询直接使用磁盘缓存中的向量)
+    with startup_phase("加载模型"):
+        model = load_encoder(backend, MODEL_NAME)
     
     # 检查集合是否存在
     try:
-        collections_info = client.get_collections()
+        with startup_phase("连接Qdrant"):
+            collections_info = client.get_collections()
         collection_names = [c.name for c in collections_info.collections]
         print(f"服务器上的集合: {collection_names}")
         
@@ -27,7 +36,7 @@ def main():
                 vector_size = model.get_sentence_embedding_dimension()
                 client.create_collection(
                     collection_name=collection_name,
-                    vectors_config={"size": vector_size, "distance": "Cosine"}
+                    **collection_config(vector_size)
                 )
                 print(f"已创建集合: {collection_name}")
                 add_sample_data(client, model, collection_name)
@@ -53,6 +62,7 @@ def main():
             if should_add_data:
                 add_sample_data(client, model, collection_name)
     
+        print_startup_timing()
         # 交互式搜索
         while True:
             query = input("\n请输入搜索关键词 (输入'exit'退出): ")
@@ -72,15 +82,18 @@ def main():
 
 def search_qdrant(client, model, query_text, collection_name="knowledge_base", limit=5):
     """在Qdrant中搜索"""
-    # 生成查询文本的嵌入向量
-    query_vector = model.encode(query_text).tolist()
+    # 生成查询文本的嵌入向量(float32数组直接交给客户端)
+    query_vector = model.encode(query_text)
     
     # 在Qdrant中搜索
-    search_result = client.search(
+    search_result = client.query_points(
         collection_name=collection_name,
-        query_vector=query_vector,
-        limit=limit
-    )
+        query=query_vector,
+        limit=limit * CHUNK_FETCH_FACTOR,
+        search_params=search_params()
+    ).points
+    # 分块导入的长文档只保留得分最高的窗口
+    search_result = collapse_chunks(search_result, limit)
     
     # 打印结果
     print(f"\n搜索 '{query_text}' 的结果:")
@@ -123,15 +136,14 @@ def add_sample_data(client, model, collection_name):
         {"company": "BYD", "type": "company_info", "year": "2023", "category": "销售数据"}
     ]
     
-    # 为文本生成嵌入向量
-    vectors = [model.encode(text).tolist() for text in texts]
+    # 批量生成嵌入向量(float32数组)
+    vectors = model.encode(texts)
     
-    # 添加到Qdrant
-    points = []
-    for i, (vec, text, meta) in enumerate(zip(vectors, texts, metadata)):
+    payloads = []
+    for text, meta in zip(texts, metadata):
         payload = {"text": text}
         payload.update(meta)
-        points.append({"id": i, "vector": vec, "payload": payload})
+        payloads.append(payload)
     
     # 删除现有点（如果有）
     try:
@@ -143,10 +155,12 @@ def add_sample_data(client, model, collection_name):
     except Exception:
         pass  # 忽略删除错误
     
-    # 添加新点
-    client.upsert(
+    # 添加新点: upload_collection 直接接受numpy数组
+    client.upload_collection(
         collection_name=collection_name,
-        points=points,
+        vectors=vectors,
+        payload=payloads,
+        ids=list(range(len(texts))),
         wait=True
     )
     
@@ -1,15 +1,31 @@
 #!/usr/bin/env python3
 import os
+import gc
 import json
+import argparse
+import inspect
+import multiprocessing
 import uvicorn
+import uuid
+import asyncio
+import httpx
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, Field, StrictBool, StrictInt, StrictStr
+from typing import Optional, Dict, Any, List, Union
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (
+    Filter, FieldCondition, MatchValue, MatchAny, PayloadSchemaType,
+    Batch, Prefetch, FusionQuery, Fusion, QueryRequest
+)
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embed_batcher import EmbeddingBatcher
+from query_cache import LRUCache, normalize_text
+from collection_profile import get_profile, collection_config, search_params
+import embedding_backend
+from embedding_cache import cached_encoder
+import sparse_encoder
 
 app = FastAPI(title="Qdrant MCP Server")
 
@@ -22,18 +38,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 连接到本地Qdrant服务器
+# 本地Qdrant服务器连接配置
 qdrant_host = os.getenv("QDRANT_HOST", "localhost")
 qdrant_port = int(os.getenv("QDRANT_PORT", "6333"))
-client = QdrantClient(host=qdrant_host, port=qdrant_port)
+qdrant_grpc_port = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+qdrant_prefer_grpc = os.getenv("QDRANT_PREFER_GRPC", "true").lower() in ("1", "true", "yes")
+qdrant_pool_size = int(os.getenv("QDRANT_POOL_SIZE", "16"))
+# gRPC通道数: 一个HTTP/2通道可以复用多个并发请求，少量通道轮询即可
+qdrant_grpc_channels = int(os.getenv("QDRANT_GRPC_CHANNELS", "4"))
+qdrant_timeout = float(os.getenv("QDRANT_TIMEOUT", "10"))
+
+# 异步客户端在启动时创建，关闭时释放
+client: Optional[AsyncQdrantClient] = None
+# 限制同时在途的Qdrant请求数，超出部分排队等待(对两种传输方式都生效)
+qdrant_slots = asyncio.Semaphore(qdrant_pool_size)
+
+def create_client():
+    """
+    创建异步Qdrant客户端，可优先使用gRPC。
+    连接池按传输方式设置: REST 使用 QDRANT_POOL_SIZE 个连接的httpx连接池；
+    gRPC 使用 QDRANT_GRPC_CHANNELS 个通道轮询(需要 qdrant-client>=1.16，更早的版本只有一个通道)
+    """
+    kwargs = {}
+    if qdrant_prefer_grpc and "pool_size" in inspect.signature(AsyncQdrantClient.__init__).parameters:
+        # pool_size 与 limits 不能同时指定；少数走REST的调用使用客户端默认的连接池，并发仍受 qdrant_slots 限制
+        kwargs["pool_size"] = qdrant_grpc_channels
+        # 每个通道使用自己的TCP连接，否则参数相同的通道会共享同一个连接
+        kwargs["grpc_options"] = {"grpc.use_local_subchannel_pool": 1}
+    else:
+        # REST连接池上限，与并发上限一致
+        kwargs["limits"] = httpx.Limits(
+            max_connections=qdrant_pool_size,
+            max_keepalive_connections=qdrant_pool_size
+        )
+    return AsyncQdrantClient(
+        host=qdrant_host,
+        port=qdrant_port,
+        grpc_port=qdrant_grpc_port,
+        prefer_grpc=qdrant_prefer_grpc,
+        timeout=max(1, int(qdrant_timeout)),
+        **kwargs
+    )
+
+async def qdrant_call(method, *args, **kwargs):
+    """在连接池上限与单次调用超时内执行一次Qdrant请求"""
+    async with qdrant_slots:
+        try:
+            return await asyncio.wait_for(method(*args, **kwargs), qdrant_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Qdrant请求超时 ({qdrant_timeout}秒)")
+
+# 文本嵌入模型: 开发模式在启动事件中加载，生产模式在fork工作进程之前加载
+# 后端由 EMBED_BACKEND 选择 (torch, onnx, onnx-int8)
+model_name = embedding_backend.MODEL_NAME
+embed_backend = embedding_backend.get_backend()
+model = None
+
+# 嵌入微批处理: 在等待窗口内合并并发请求，批量编码
+embed_batch_max_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+embed_batch_wait_ms = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+batcher: Optional[EmbeddingBatcher] = None
+
+# 预热编码完成后才报告就绪
+ready = False
+
+def load_model():
+    """加载嵌入模型(已加载则直接返回)"""
+    global model
+    if model is None:
+        print(f"正在加载嵌入模型: {model_name} (后端: {embed_backend})")
+        model = embedding_backend.load_model(embed_backend, model_name)
+    return model
 
-# 加载文本嵌入模型
-model_name = "paraphrase-multilingual-MiniLM-L12-v2"
-model = SentenceTransformer(model_name)
+# 查询向量缓存(按规范化文本与模型名)和搜索结果缓存(按集合版本失效)
+embedding_cache = LRUCache(
+    max_bytes=int(os.getenv("EMBED_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("EMBED_CACHE_TTL", "3600"))
+)
+result_cache = LRUCache(
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    # wait=False 写入可能稍后才可见，结果缓存保持较短的存活时间
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "30"))
+)
+# 集合版本号，每次写入后递增，使旧的搜索结果缓存失效。
+# 计数器在共享内存中: 生产模式在fork之前导入本模块，任一工作进程写入后所有工作进程的缓存键都随之变化
+shared_collection_version = multiprocessing.Value("q", 0)
+
+def collection_version():
+    return shared_collection_version.value
+
+def bump_collection_version():
+    """集合内容发生变化: 递增版本号并清空本进程的结果缓存(其他进程的旧条目因版本号不同不再命中)"""
+    with shared_collection_version.get_lock():
+        shared_collection_version.value += 1
+    result_cache.clear()
+
+async def embed_query(text):
+    """获取查询向量，优先使用缓存；缓存键按规范化文本计算，编码的是原文本(与导入时一致)"""
+    key = (model_name, embed_backend, normalize_text(text))
+    vector = embedding_cache.get(key)
+    if vector is None:
+        vector = await batcher.encode(text)
+        embedding_cache.put(key, vector)
+    return vector
+
+# 批量导入时每个上传块的点数
+store_batch_chunk_size = int(os.getenv("STORE_BATCH_CHUNK_SIZE", "256"))
 
 # 集合名称
 COLLECTION_NAME = "cars"
 
+# 集合性能配置(量化、落盘、HNSW参数)，由 QDRANT_PROFILE 选择
+collection_profile = get_profile()
+
+# 混合检索: 同时存储BM25稀疏向量，查询时稠密与稀疏检索结果用RRF融合
+# 仅当集合配置了稀疏向量时生效(在启动时检测)
+hybrid_search_enabled = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+# 融合前每路检索的候选数量: max(limit * 倍数, 下限)
+hybrid_prefetch_factor = int(os.getenv("HYBRID_PREFETCH_FACTOR", "4"))
+hybrid_prefetch_min = int(os.getenv("HYBRID_PREFETCH_MIN", "20"))
+collection_has_sparse = False
+
+def use_hybrid():
+    return hybrid_search_enabled and collection_has_sparse
+
+# 启动时自动建立关键字索引的过滤字段(对应 sample_cars.json 中的字段)
+INDEXED_FIELDS = [f.strip() for f in os.getenv("QDRANT_INDEXED_FIELDS", "brand,type,powertrain").split(",") if f.strip()]
+
+# 过滤值: 与Qdrant的 MatchValue / MatchAny 接受的类型一致，其他类型(浮点数、对象、null)在请求校验时返回422
+FilterValue = Union[StrictStr, StrictInt, StrictBool, List[StrictStr], List[StrictInt]]
+
 # 数据模型
 class StoreRequest(BaseModel):
     information: str
@@ -41,6 +175,12 @@ class StoreRequest(BaseModel):
 
 class FindRequest(BaseModel):
     query: str
+    # 元数据过滤，如 {"brand": "BYD", "powertrain": ["EV", "PHEV (DM-i)"]}，列表表示匹配任意一个
+    filters: Optional[Dict[str, FilterValue]] = Field(default=None)
+    limit: int = Field(default=5, ge=1, le=100)
+    score_threshold: Optional[float] = Field(default=None)
+    # 只返回指定的payload字段，"text" 字段对应结果中的content
+    fields: Optional[List[str]] = Field(default=None)
 
 class StoreResponse(BaseModel):
     status: str
@@ -49,18 +189,46 @@ class StoreResponse(BaseModel):
 class FindResponse(BaseModel):
     results: List[Dict[str, Any]]
 
+class FindBatchRequest(BaseModel):
+    queries: List[FindRequest] = Field(..., min_length=1, max_length=64)
+
+class FindBatchResponse(BaseModel):
+    # 与请求中queries的顺序一致
+    results: List[List[Dict[str, Any]]]
+
 @app.get("/")
 async def root():
     return {"message": "欢迎使用Qdrant MCP服务器"}
 
+@app.get("/health")
+async def health():
+    return {"status": "ok", "pid": os.getpid()}
+
+@app.get("/ready")
+async def readiness():
+    if not ready:
+        raise HTTPException(status_code=503, detail="服务尚未就绪")
+    return {"status": "ready", "pid": os.getpid()}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "pid": os.getpid(),
+        "embedding_batcher": batcher.metrics() if batcher is not None else None,
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_disk_cache": batcher.model.cache_stats() if batcher is not None and hasattr(batcher.model, "cache_stats") else None,
+        "result_cache": result_cache.stats(),
+        "collection_version": collection_version(),
+        "hybrid_search": use_hybrid()
+    }
+
 @app.post("/qdrant-store", response_model=StoreResponse)
 async def store_information(request: StoreRequest):
     try:
         # 生成嵌入向量
-        embedding = model.encode(request.information).tolist()
+        embedding = await batcher.encode(request.information)
         
         # 生成唯一ID
-        import uuid
         doc_id = str(uuid.uuid4())
         
         # 准备元数据
@@ -68,66 +236,401 @@ async def store_information(request: StoreRequest):
         metadata["text"] = request.information
         
         # 存储到Qdrant
-        client.upsert(
+        await qdrant_call(
+            client.upsert,
             collection_name=COLLECTION_NAME,
-            points=[
-                {
-                    "id": doc_id,
-                    "vector": embedding,
-                    "payload": metadata
-                }
-            ]
+            points=build_batch([doc_id], [embedding], [metadata])
         )
+        bump_collection_version()
         
         return {"status": "success", "id": doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"存储失败: {str(e)}")
 
+def build_batch(ids, embeddings, payloads):
+    """
+    构造批量写入请求，集合支持混合检索时附带稀疏向量。
+    向量先合并为一个float32数组，整批一次性转换为线格式需要的列表，不为每个点构造PointStruct。
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32).tolist()
+    if collection_has_sparse:
+        vectors = {
+            "": vectors,
+            sparse_encoder.SPARSE_VECTOR_NAME: [sparse_encoder.encode_document(payload["text"]) for payload in payloads]
+        }
+    return Batch(ids=ids, vectors=vectors, payloads=payloads)
+
+async def receive_body(receive):
+    """从ASGI receive逐块读取请求体，客户端提前断开时抛出 ClientDisconnect"""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnect()
+        body = message.get("body", b"")
+        if body:
+            yield body
+        if not message.get("more_body", False):
+            return
+
+async def iter_ndjson(chunks):
+    """逐行解析流式NDJSON请求体，产出 (行号, 文档或错误信息)"""
+    buffer = bytearray()
+    line_no = 0
+    async for chunk in chunks:
+        # 缓冲区中只剩不完整的一行，只需在新追加的字节中查找换行
+        scan_from = len(buffer)
+        buffer += chunk
+        end = buffer.find(b"\n", scan_from)
+        line_start = 0
+        while end != -1:
+            line_no += 1
+            yield line_no, parse_ndjson_line(bytes(buffer[line_start:end]))
+            line_start = end + 1
+            end = buffer.find(b"\n", line_start)
+        del buffer[:line_start]
+    if buffer.strip():
+        yield line_no + 1, parse_ndjson_line(bytes(buffer))
+
+def parse_ndjson_line(line):
+    """解析一行NDJSON，返回 StoreRequest、None(空行) 或错误字符串"""
+    if not line.strip():
+        return None
+    try:
+        return StoreRequest(**json.loads(line))
+    except Exception as e:
+        return f"无效的记录: {str(e)}"
+
+async def store_chunk(docs):
+    """批量编码并以 wait=False 上传一个块，返回写入的ID"""
+    embeddings = await batcher.encode_many([doc.information for doc in docs])
+    ids = [str(uuid.uuid4()) for _ in docs]
+    payloads = []
+    for doc in docs:
+        metadata = doc.metadata or {}
+        metadata["text"] = doc.information
+        payloads.append(metadata)
+    await qdrant_call(
+        client.upsert,
+        collection_name=COLLECTION_NAME,
+        points=build_batch(ids, embeddings, payloads),
+        wait=False
+    )
+    bump_collection_version()
+    return ids
+
+class StoreBatchEndpoint:
+    """
+    接收流式NDJSON文档(每行一个StoreRequest)，分块编码上传并逐块返回确认。
+    作为原始ASGI端点自己读取请求体: StreamingResponse 会同时监听客户端断开并消费请求体消息，
+    不能在响应生成器中读取请求体
+    """
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson")]
+        })
+        try:
+            async for ack in self.acknowledgements(receive):
+                await send({"type": "http.response.body", "body": ack.encode("utf-8"), "more_body": True})
+        except ClientDisconnect:
+            # 客户端已断开，已确认的块保留在集合中
+            return
+        await send({"type": "http.response.body", "body": b""})
+
+    async def acknowledgements(self, receive):
+        chunk_index = 0
+        stored = 0
+        failed = 0
+        docs = []
+        errors = []
+
+        async def flush():
+            nonlocal chunk_index, stored, failed
+            ack = {"chunk": chunk_index, "errors": errors[:]}
+            try:
+                ids = await store_chunk(docs) if docs else []
+                ack.update({"status": "success", "count": len(ids), "ids": ids})
+                stored += len(ids)
+            except Exception as e:
+                ack.update({"status": "error", "count": 0, "detail": f"存储失败: {str(e)}"})
+                failed += len(docs)
+            failed += len(errors)
+            chunk_index += 1
+            docs.clear()
+            errors.clear()
+            return json.dumps(ack, ensure_ascii=False) + "\n"
+
+        async for line_no, doc in iter_ndjson(receive_body(receive)):
+            if doc is None:
+                continue
+            if isinstance(doc, str):
+                errors.append({"line": line_no, "detail": doc})
+            else:
+                docs.append(doc)
+            if len(docs) >= store_batch_chunk_size:
+                yield await flush()
+
+        if docs or errors:
+            yield await flush()
+        yield json.dumps({"status": "done", "chunks": chunk_index, "stored": stored, "failed": failed}, ensure_ascii=False) + "\n"
+
+app.add_route("/qdrant-store-batch", StoreBatchEndpoint(), methods=["POST"])
+
+def build_filter(filters):
+    """将请求中的过滤条件转换为Qdrant Filter"""
+    if not filters:
+        return None
+    conditions = []
+    for key, value in filters.items():
+        if isinstance(value, list):
+            match = MatchAny(any=value)
+        else:
+            match = MatchValue(value=value)
+        conditions.append(FieldCondition(key=key, match=match))
+    return Filter(must=conditions)
+
+def format_scored_point(scored_point):
+    """将搜索命中转换为响应格式"""
+    payload = scored_point.payload or {}
+    return {
+        "id": scored_point.id,
+        "score": scored_point.score,
+        "content": payload.get("text", ""),
+        "metadata": {k: v for k, v in payload.items() if k != "text"}
+    }
+
+def find_cache_key(request):
+    """搜索结果缓存键，包含当前集合版本号"""
+    return (
+        COLLECTION_NAME,
+        collection_version(),
+        normalize_text(request.query),
+        request.limit,
+        request.score_threshold,
+        json.dumps(request.filters, sort_keys=True, ensure_ascii=False),
+        tuple(request.fields) if request.fields is not None else None
+    )
+
+def build_query_request(request, query_vector):
+    """
+    构造一条查询: 混合检索时稠密与稀疏两路预取后用RRF融合，否则只做稠密检索。
+    指定 score_threshold 时只做稠密检索: RRF分数是排名分数，不能与余弦相似度阈值比较
+    """
+    query_filter = build_filter(request.filters)
+    with_payload = request.fields if request.fields is not None else True
+    params = search_params(collection_profile)
+
+    if not use_hybrid() or request.score_threshold is not None:
+        return QueryRequest(
+            query=query_vector.tolist(),
+            filter=query_filter,
+            limit=request.limit,
+            score_threshold=request.score_threshold,
+            with_payload=with_payload,
+            params=params
+        )
+
+    prefetch_limit = max(request.limit * hybrid_prefetch_factor, hybrid_prefetch_min)
+    return QueryRequest(
+        prefetch=[
+            Prefetch(
+                query=query_vector.tolist(),
+                filter=query_filter,
+                limit=prefetch_limit,
+                params=params
+            ),
+            Prefetch(
+                query=sparse_encoder.encode_query(request.query),
+                using=sparse_encoder.SPARSE_VECTOR_NAME,
+                filter=query_filter,
+                limit=prefetch_limit
+            ),
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=request.limit,
+        with_payload=with_payload
+    )
+
+async def run_queries(query_requests):
+    """一次调用执行多条查询，按顺序返回每条查询的命中列表"""
+    responses = await qdrant_call(
+        client.query_batch_points,
+        collection_name=COLLECTION_NAME,
+        requests=query_requests
+    )
+    return [response.points for response in responses]
+
 @app.post("/qdrant-find", response_model=FindResponse)
 async def find_information(request: FindRequest):
     try:
+        cache_key = find_cache_key(request)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return {"results": cached}
+
         # 生成查询向量
-        query_vector = model.encode(request.query).tolist()
+        query_vector = await embed_query(request.query)
         
         # 在Qdrant中搜索
-        search_result = client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
-            limit=5
-        )
+        search_result = (await run_queries([build_query_request(request, query_vector)]))[0]
         
         # 格式化结果
-        results = []
-        for scored_point in search_result:
-            result = {
-                "id": scored_point.id,
-                "score": scored_point.score,
-                "content": scored_point.payload.get("text", ""),
-                "metadata": {k: v for k, v in scored_point.payload.items() if k != "text"}
-            }
-            results.append(result)
-            
+        results = [format_scored_point(scored_point) for scored_point in search_result]
+        
+        # 查询期间若有写入，版本号已变化，不再缓存旧结果
+        if cache_key[1] == collection_version():
+            result_cache.put(cache_key, results)
         return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
+@app.post("/qdrant-find-batch", response_model=FindBatchResponse)
+async def find_information_batch(request: FindBatchRequest):
+    """一次请求执行多条查询: 批量编码，一次调用Qdrant批量搜索，按请求顺序返回"""
+    try:
+        cache_keys = [find_cache_key(query) for query in request.queries]
+        results = [result_cache.get(key) for key in cache_keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+
+        if pending:
+            # 并发提交的文本由批处理器合并为一次编码
+            vectors = await asyncio.gather(*(embed_query(request.queries[i].query) for i in pending))
+            batch_result = await run_queries([
+                build_query_request(request.queries[i], vector)
+                for i, vector in zip(pending, vectors)
+            ])
+
+            for i, search_result in zip(pending, batch_result):
+                results[i] = [format_scored_point(scored_point) for scored_point in search_result]
+                if cache_keys[i][1] == collection_version():
+                    result_cache.put(cache_keys[i], results[i])
+
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量查询失败: {str(e)}")
+
 @app.on_event("startup")
 async def startup_event():
-    # 检查集合是否存在，不存在则创建
-    collections = client.get_collections().collections
+    global client, batcher, collection_has_sparse
+    client = create_client()
+    # 磁盘嵌入缓存在每个工作进程中各自打开，内存缓存未命中时查询
+    batcher = EmbeddingBatcher(cached_encoder(load_model(), model_name, embed_backend), max_batch_size=embed_batch_max_size, max_wait_ms=embed_batch_wait_ms)
+    await batcher.start()
+
+    # 生产模式下主进程在fork之前已完成，这里只会发现集合和索引已存在
+    await setup_collection(client)
+
+    info = await qdrant_call(client.get_collection, collection_name=COLLECTION_NAME)
+    collection_has_sparse = sparse_encoder.has_sparse_vectors(info)
+    if hybrid_search_enabled and not collection_has_sparse:
+        print(f"集合 {COLLECTION_NAME} 未配置稀疏向量，仅使用稠密检索")
+
+    await warm_up()
+
+async def setup_collection(qdrant):
+    """检查集合是否存在，不存在则创建，并为过滤字段建立payload索引"""
+    collections = (await qdrant.get_collections()).collections
     collection_names = [collection.name for collection in collections]
     
     if COLLECTION_NAME not in collection_names:
-        client.create_collection(
+        await qdrant.create_collection(
             collection_name=COLLECTION_NAME,
-            vectors_config={
-                "size": model.get_sentence_embedding_dimension(),
-                "distance": "Cosine"
-            }
+            **collection_config(load_model().get_sentence_embedding_dimension(), collection_profile, sparse=hybrid_search_enabled)
         )
-        print(f"创建了新集合: {COLLECTION_NAME}")
+        print(f"创建了新集合: {COLLECTION_NAME} (配置: {collection_profile['name']})")
     else:
         print(f"集合 {COLLECTION_NAME} 已存在")
 
+    await ensure_payload_indexes(qdrant, INDEXED_FIELDS)
+
+async def prepare_collection():
+    """
+    生产模式: 主进程在fork之前创建集合和索引，避免多个工作进程同时创建时除一个外都失败。
+    使用REST客户端，主进程中不初始化gRPC (gRPC运行时在fork之后不可用)
+    """
+    qdrant = AsyncQdrantClient(host=qdrant_host, port=qdrant_port, prefer_grpc=False, timeout=max(1, int(qdrant_timeout)))
+    try:
+        await setup_collection(qdrant)
+    finally:
+        await qdrant.close()
+
+async def warm_up():
+    """预热: 在报告就绪之前完成一次编码，避免首个请求承担冷启动开销"""
+    global ready
+    await batcher.encode("warm up")
+    ready = True
+    print(f"工作进程 {os.getpid()} 已就绪")
+
+async def ensure_payload_indexes(qdrant, fields):
+    """为过滤字段创建关键字payload索引，已存在的索引跳过"""
+    info = await qdrant.get_collection(collection_name=COLLECTION_NAME)
+    existing = set((info.payload_schema or {}).keys())
+    for field in fields:
+        if field in existing:
+            continue
+        await qdrant.create_payload_index(
+            collection_name=COLLECTION_NAME,
+            field_name=field,
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+        print(f"创建了payload索引: {COLLECTION_NAME}.{field}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    global ready
+    ready = False
+    if batcher is not None:
+        await batcher.stop()
+    if client is not None:
+        await client.close()
+
+def limit_worker_threads(server, worker):
+    """fork之后按工作进程数分配每个进程的推理线程，避免线程超额订阅"""
+    num_threads = max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    # ONNX推理会话在工作进程首次编码时创建，读取该环境变量
+    os.environ["EMBED_NUM_THREADS"] = str(num_threads)
+    if embed_backend == "torch":
+        import torch
+        torch.set_num_threads(num_threads)
+
+def run_production(host, port, workers):
+    """生产模式: 预加载模型后fork多个工作进程，通过写时复制共享模型权重"""
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            # uvicorn.workers 已弃用，使用单独维护的 uvicorn-worker 包
+            self.cfg.set("worker_class", "uvicorn_worker.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", limit_worker_threads)
+            # 工作进程在启动事件中完成预热后才开始接受请求
+            self.cfg.set("timeout", 120)
+
+        def load(self):
+            return app
+
+    load_model()
+    asyncio.run(prepare_collection())
+    # 冻结已有对象，避免fork后GC触碰这些对象导致页面被复制
+    gc.freeze()
+    ProductionServer().run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant MCP服务器")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", "0")),
+                        help="生产模式的工作进程数，0表示开发模式(单进程，自动重载)")
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        run_production(args.host, args.port, args.workers)
+    else:
+        uvicorn.run("server:app", host=args.host, port=args.port, reload=True)
+
 if __name__ == "__main__":
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    main() 
\ No newline at end of file
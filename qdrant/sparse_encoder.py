@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+BM25风格的稀疏词项向量
+与稠密向量一起存储，用于精确匹配车型名称等词项(如 "Song PLUS"、"秦Plus DM-i")。
+
+  - 分词: 英文/数字按词切分(保留 "dm-i" 这类连字符词并额外拆分)，
+          中文使用单字 + 相邻双字，不依赖词典，导入与查询时分词结果一致
+  - 文档权重: BM25的词频饱和部分 tf*(k1+1)/(tf+k1*(1-b+b*dl/avgdl))
+  - IDF: 由Qdrant在服务端计算 (稀疏向量配置 modifier=IDF)
+  - 词项编号: crc32(词项)，无需维护词表
+"""
+
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+from qdrant_client.http.models import Modifier, SparseVector, SparseVectorParams
+
+SPARSE_VECTOR_NAME = "text-sparse"
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+AVG_DOC_LENGTH = 64
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text):
+    """将文本切分为词项，中文输出单字和双字"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        token = match.group()
+        if CJK_RE.match(token):
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+            parts = re.split(r"[-.]", token)
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+def token_index(token):
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse(weights):
+    # 不同词项的crc32可能相同，相同编号的权重合并
+    merged = {}
+    for token, weight in weights.items():
+        index = token_index(token)
+        merged[index] = merged.get(index, 0.0) + weight
+    indices = sorted(merged)
+    return SparseVector(indices=indices, values=[merged[i] for i in indices])
+
+
+def encode_document(text):
+    """为文档生成BM25词频权重稀疏向量"""
+    counts = Counter(tokenize(text))
+    doc_length = sum(counts.values())
+    norm = K1 * (1 - B + B * doc_length / AVG_DOC_LENGTH)
+    return _to_sparse({token: tf * (K1 + 1) / (tf + norm) for token, tf in counts.items()})
+
+
+def encode_query(text):
+    """为查询生成稀疏向量，每个词项权重为1 (IDF由Qdrant计算)"""
+    return _to_sparse({token: 1.0 for token in set(tokenize(text))})
+
+
+def sparse_vectors_config():
+    """集合的稀疏向量配置"""
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+
+def has_sparse_vectors(collection_info):
+    """集合是否配置了本模块使用的稀疏向量"""
+    sparse = collection_info.config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse
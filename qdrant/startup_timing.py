@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+命令行工具的启动计时
+qdrant_client、numpy、pandas 和模型等重量级依赖在命令真正需要时才导入，
+帮助、参数错误和文件不存在等检查不需要等待它们。
+开始实际工作之前输出一行启动用时(导入模块、加载模型、连接Qdrant各花了多少时间)。
+
+环境变量 STARTUP_TIMING=false 关闭输出。
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+ENABLED = os.getenv("STARTUP_TIMING", "true").lower() in ("1", "true", "yes")
+
+# 脚本开始导入本项目模块的时间(在解释器启动之后)
+_STARTED = time.perf_counter()
+_phases = {}
+_printed = False
+
+
+@contextmanager
+def startup_phase(name):
+    """记录一个启动阶段的耗时，同名阶段累加"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = _phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def print_startup_timing():
+    """输出一次启动用时"""
+    global _printed
+    if not ENABLED or _printed:
+        return
+    _printed = True
+    total = time.perf_counter() - _STARTED
+    phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in _phases.items())
+    print(f"启动用时 {total * 1000:.0f} ms" + (f": {phases}" if phases else ""))
@@ -0,0 +1,51 @@
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+# 脚本之间按同目录模块导入(from embed_batcher import ...)，测试同样从 qdrant/ 目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIMENSION = 8
+
+
+class FakeModel:
+    """按文本生成确定的向量，代替嵌入模型；接口与SentenceTransformer一致"""
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row] = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).random(DIMENSION, dtype=np.float32) + 0.01
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return DIMENSION
+
+
+@pytest.fixture
+def fake_model():
+    return FakeModel()
+
+
+@pytest.fixture
+def api(monkeypatch, fake_model):
+    """server.app 的测试客户端: 使用进程内的Qdrant和假模型，不需要服务器和模型文件"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from qdrant_client import AsyncQdrantClient
+
+    import server
+
+    monkeypatch.setattr(server, "create_client", lambda: AsyncQdrantClient(":memory:"))
+    monkeypatch.setattr(server, "model", fake_model)
+    monkeypatch.setattr(server, "cached_encoder", lambda model, model_name, backend: model)
+    monkeypatch.setattr(server, "store_batch_chunk_size", 256)
+    # 缓存是模块级对象，每个测试从空缓存开始
+    server.embedding_cache.clear()
+    server.result_cache.clear()
+    with TestClient(server.app) as client:
+        yield client
@@ -0,0 +1,91 @@
+import functools
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+from qdrant_client import QdrantClient
+
+import bulk_load
+from collection_profile import collection_config
+from conftest import DIMENSION
+from import_manifest import ImportManifest
+from import_pipeline import ImportPipeline
+from sparse_encoder import SPARSE_VECTOR_NAME, has_sparse_vectors
+from vector_export import ParquetExporter, read_export_metadata
+
+TEXTS = [f"第{i}篇文档 document {i}" for i in range(300)]
+
+
+@pytest.fixture
+def export(tmp_path, fake_model):
+    """用假模型导出300个点(整数ID，带稀疏向量)"""
+    path = str(tmp_path / "vectors.parquet")
+    exporter = ParquetExporter(path, DIMENSION, with_sparse=True, model_name="fake", backend="torch", row_group_size=128)
+    pipeline = ImportPipeline(fake_model, exporter, "unused", with_sparse=True, id_fn=lambda text, payload, index: index)
+    assert pipeline.run((text, {"text": text, "i": i}) for i, text in enumerate(TEXTS)) == 300
+    exporter.close()
+    return path
+
+
+@pytest.fixture
+def load(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_load, "ImportManifest", functools.partial(ImportManifest, directory=str(tmp_path / "manifests")))
+    storage = str(tmp_path / "qdrant")
+
+    def load(path, collection_name):
+        return bulk_load.bulk_load(path, collection_name, local_path=storage, batch_size=64, auto_indexes=False)
+
+    load.storage = storage
+    return load
+
+
+def retrieve_all(storage, collection_name):
+    client = QdrantClient(path=storage)
+    try:
+        points = client.retrieve(collection_name, list(range(len(TEXTS))), with_vectors=True)
+        return sorted(points, key=lambda point: point.id), client.get_collection(collection_name)
+    finally:
+        client.close()
+
+
+def dense(point):
+    vector = point.vector
+    return np.asarray(vector[""] if isinstance(vector, dict) else vector)
+
+
+def test_export_metadata(export):
+    metadata = read_export_metadata(export)
+    assert metadata["dimension"] == DIMENSION
+    assert metadata["sparse"] is True
+    assert (metadata["model"], metadata["backend"]) == ("fake", "torch")
+    assert metadata["vector_name"] is None
+
+
+def test_round_trip_into_new_collection(export, load, fake_model):
+    assert load(export, "kb") == 300
+    points, info = retrieve_all(load.storage, "kb")
+    assert has_sparse_vectors(info)
+    assert [point.id for point in points] == list(range(300))
+    assert [point.payload for point in points] == [{"text": text, "i": i} for i, text in enumerate(TEXTS)]
+    expected = fake_model.encode(TEXTS)
+    for point in points:
+        # 余弦距离只比较方向(服务器会归一化存储的向量)
+        vector = dense(point)
+        np.testing.assert_allclose(vector / np.linalg.norm(vector), expected[point.id] / np.linalg.norm(expected[point.id]), rtol=1e-5)
+        assert len(point.vector[SPARSE_VECTOR_NAME].indices) > 0
+
+
+def test_round_trip_into_collection_without_sparse(export, load):
+    client = QdrantClient(path=load.storage)
+    client.create_collection(collection_name="dense_only", **collection_config(DIMENSION, sparse=False))
+    client.close()
+
+    assert load(export, "dense_only") == 300
+    points, info = retrieve_all(load.storage, "dense_only")
+    assert not has_sparse_vectors(info)
+    assert len(points) == 300
+    assert all(dense(point).shape == (DIMENSION,) for point in points)
+
+    # 清单记录了已加载的点，重复加载时全部跳过
+    assert load(export, "dense_only") == 0
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+from chunker import TokenChunker, chunk_items, collapse_chunks
+
+
+def approx_chunker(max_tokens, overlap):
+    # 不加载分词器，按近似token(英文按词)切分
+    chunker = TokenChunker(max_tokens, overlap)
+    chunker._tokenizer_loaded = True
+    return chunker
+
+
+def words(start, stop):
+    return " ".join(f"w{i}" for i in range(start, stop))
+
+
+def test_windows_overlap_by_configured_tokens():
+    chunker = approx_chunker(10, 3)
+    assert chunker.split(words(0, 25)) == [words(0, 10), words(7, 17), words(14, 24), words(21, 25)]
+
+
+def test_last_window_ends_exactly_at_text_end():
+    chunker = approx_chunker(10, 2)
+    # 步长8: 0-10, 8-18, 16-24，最后一个窗口正好结束时不再多出一个窗口
+    assert chunker.split(words(0, 24)) == [words(0, 10), words(8, 18), words(16, 24)]
+
+
+@pytest.mark.parametrize("count", [1, 9, 10])
+def test_text_within_one_window_is_unchanged(count):
+    text = "  " + words(0, count) + "\n"
+    assert approx_chunker(10, 3).split(text) == [text]
+
+
+def test_reserved_tokens_shrink_windows():
+    chunker = approx_chunker(10, 2)
+    assert chunker.split(words(0, 12), reserved_tokens=4) == [words(0, 6), words(4, 10), words(8, 12)]
+
+
+def test_chinese_is_split_by_character():
+    chunker = approx_chunker(4, 1)
+    assert chunker.split("一二三四五六七") == ["一二三四", "四五六七"]
+
+
+@pytest.mark.parametrize("max_tokens, overlap", [(10, 10), (10, 11), (10, -1), (0, 0)])
+def test_invalid_parameters_rejected(max_tokens, overlap):
+    with pytest.raises(ValueError):
+        TokenChunker(max_tokens, overlap)
+
+
+def test_chunk_items_payloads():
+    chunker = approx_chunker(10, 3)
+    items = [(words(0, 5), {"text": words(0, 5), "i": 0}), (words(0, 25), {"text": words(0, 25), "i": 1})]
+    chunks = list(chunk_items(items, chunker))
+
+    # 短文档保持为一个点，payload不变
+    assert chunks[0] == items[0]
+    windows = chunks[1:]
+    assert [payload["chunk_index"] for _, payload in windows] == [0, 1, 2, 3]
+    assert {payload["chunk_count"] for _, payload in windows} == {4}
+    assert len({payload["parent_id"] for _, payload in windows}) == 1
+    assert all(text == payload["text"] and payload["i"] == 1 for text, payload in windows)
+    # 父文档ID由内容决定
+    again = list(chunk_items(items, chunker))
+    assert again[1][1]["parent_id"] == windows[0][1]["parent_id"]
+
+
+def test_collapse_chunks_keeps_best_window_per_parent():
+    points = [
+        SimpleNamespace(id=1, payload={"parent_id": "a"}),
+        SimpleNamespace(id=2, payload={"parent_id": "a"}),
+        SimpleNamespace(id=3, payload={}),
+        SimpleNamespace(id=4, payload={"parent_id": "b"}),
+    ]
+    assert [point.id for point in collapse_chunks(points, 10)] == [1, 3, 4]
+    assert [point.id for point in collapse_chunks(points, 2)] == [1, 3]
@@ -0,0 +1,105 @@
+import time
+import asyncio
+
+import numpy as np
+import pytest
+
+from embed_batcher import EmbeddingBatcher
+
+
+class RecordingModel:
+    """记录每次编码的文本，fail 为真时编码抛出异常"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+        self.fail = False
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("模型出错")
+        return self.model.encode(texts)
+
+
+def run(batcher, coroutine):
+    async def main():
+        try:
+            return await coroutine()
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_batch(fake_model):
+    model = RecordingModel(fake_model)
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=50)
+    texts = [f"文本 {i}" for i in range(10)]
+
+    vectors = run(batcher, lambda: asyncio.gather(*(batcher.encode(text) for text in texts)))
+    assert model.calls == [texts]
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, fake_model.encode(text))
+    assert batcher.metrics()["batch_size_histogram"] == {10: 1}
+
+
+def test_batches_are_capped_at_max_batch_size(fake_model):
+    model = RecordingModel(fake_model)
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=50)
+    texts = [f"文本 {i}" for i in range(70)]
+
+    vectors = run(batcher, lambda: batcher.encode_many(texts))
+    assert [len(call) for call in model.calls] == [32, 32, 6]
+    assert sum(model.calls, []) == texts
+    np.testing.assert_array_equal(np.stack(vectors), fake_model.encode(texts))
+
+
+def test_lone_request_is_flushed_after_max_wait(fake_model):
+    model = RecordingModel(fake_model)
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=50)
+
+    async def encode_two():
+        started = time.perf_counter()
+        await batcher.encode("第一条")
+        first = time.perf_counter() - started
+        # 窗口结束之后提交的请求进入下一个批次
+        await batcher.encode("第二条")
+        return first
+
+    first = run(batcher, encode_two)
+    assert 0.04 <= first < 1.0
+    assert model.calls == [["第一条"], ["第二条"]]
+
+
+def test_model_error_reaches_every_waiter(fake_model):
+    model = RecordingModel(fake_model)
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=50)
+
+    async def fail_then_recover():
+        model.fail = True
+        results = await asyncio.gather(*(batcher.encode(f"文本 {i}") for i in range(5)), return_exceptions=True)
+        model.fail = False
+        # 出错的批次不影响之后的请求
+        return results, await batcher.encode("恢复")
+
+    results, vector = run(batcher, fail_then_recover)
+    assert len(model.calls) == 2 and len(model.calls[0]) == 5
+    assert all(isinstance(result, RuntimeError) for result in results)
+    np.testing.assert_array_equal(vector, fake_model.encode("恢复"))
+
+
+def test_cancelled_request_is_skipped(fake_model):
+    model = RecordingModel(fake_model)
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=50)
+
+    async def cancel_one():
+        cancelled = asyncio.ensure_future(batcher.encode("取消"))
+        kept = asyncio.ensure_future(batcher.encode("保留"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return await kept
+
+    run(batcher, cancel_one)
+    assert model.calls == [["保留"]]
@@ -0,0 +1,76 @@
+import os
+import stat
+import time
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("当前平台不支持Unix socket", allow_module_level=True)
+
+import embed_daemon
+import embedding_backend
+import embedding_cache
+from embed_daemon import DaemonEncoder, EmbeddingDaemon
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch, fake_model):
+    """在后台线程中运行使用假模型的守护进程"""
+    monkeypatch.setattr(embedding_backend, "load_model", lambda backend, model_name: fake_model)
+    monkeypatch.setattr(embedding_cache, "cached_encoder", lambda model, model_name, backend: model)
+    path = str(tmp_path / "embed.sock")
+    daemon = EmbeddingDaemon(path, backend="torch")
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not embed_daemon.socket_in_use(path):
+        assert time.monotonic() < deadline, "守护进程没有启动"
+        time.sleep(0.01)
+    yield daemon
+    encoder = DaemonEncoder(path)
+    encoder.request({"op": "stop"})
+    encoder.close()
+    thread.join(10)
+    assert not thread.is_alive()
+
+
+def send_raw(sock, payload):
+    sock.sendall(embed_daemon._HEADER.pack(len(payload)) + payload)
+    return embed_daemon._recv_message(sock)
+
+
+def test_socket_created_owner_only(daemon):
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+    # 进程的umask已恢复
+    assert umask != 0o177
+
+
+def test_encode_through_socket(daemon, fake_model):
+    encoder = DaemonEncoder(daemon.socket_path)
+    try:
+        texts = ["第一条", "第二条"]
+        np.testing.assert_array_equal(encoder.encode(texts), fake_model.encode(texts))
+        np.testing.assert_array_equal(encoder.encode("第一条"), fake_model.encode("第一条"))
+        assert encoder.encode([]).shape == (0, fake_model.get_sentence_embedding_dimension())
+    finally:
+        encoder.close()
+
+
+@pytest.mark.parametrize("payload", [b"{not json", b"\xff\xfe", b"[1, 2]"])
+def test_malformed_request_gets_error_reply(daemon, payload):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(daemon.socket_path)
+    try:
+        response = send_raw(sock, payload)
+        assert response["ok"] is False and "无效的请求" in response["error"]
+        # 同一连接上的后续请求正常处理
+        assert send_raw(sock, b'{"op": "info"}')["ok"] is True
+        assert send_raw(sock, b'{"op": "unknown"}')["ok"] is False
+    finally:
+        sock.close()
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("sentence_transformers")
+
+import embedding_backend
+from embedding_backend import COSINE_TOLERANCE, VERIFY_SENTENCES
+
+# 设置后使用真实模型(需要网络或本地缓存)，例如 EMBED_TEST_MODEL=paraphrase-multilingual-MiniLM-L12-v2
+TEST_MODEL = os.getenv("EMBED_TEST_MODEL")
+
+
+def build_tiny_model(directory):
+    """构造一个小型BERT(随机权重)和覆盖校验句子的字符级词表，保存为本地模型目录"""
+    torch.manual_seed(0)
+    characters = sorted({char for sentence in VERIFY_SENTENCES for char in sentence.lower() if not char.isspace()})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + characters
+    os.makedirs(directory)
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+
+    transformers.BertTokenizerFast(vocab_file).save_pretrained(directory)
+    config = transformers.BertConfig(
+        vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+        intermediate_size=128, max_position_embeddings=embedding_backend.MAX_SEQ_LENGTH
+    )
+    transformers.BertModel(config).eval().save_pretrained(directory)
+    return directory
+
+
+@pytest.fixture(scope="module")
+def model_name(tmp_path_factory):
+    if TEST_MODEL:
+        return TEST_MODEL
+    return build_tiny_model(str(tmp_path_factory.mktemp("models") / "tiny-bert"))
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx"))
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backend_within_cosine_tolerance(backend, model_name, onnx_dir, monkeypatch):
+    monkeypatch.setattr(embedding_backend, "ONNX_DIR", onnx_dir)
+    # 导出(和量化)后 verify_backend 与PyTorch比较，超出容差时抛出 RuntimeError
+    path = embedding_backend.ensure_onnx_model(backend == "onnx-int8", model_name)
+    worst = embedding_backend.verify_backend(backend, path, model_name)
+    assert worst >= COSINE_TOLERANCE[backend]
+
+    # 加载入口与PyTorch后端的输出逐条比较，输入顺序与批次切分不影响结果
+    from sentence_transformers import SentenceTransformer
+
+    sentences = VERIFY_SENTENCES[::-1] + VERIFY_SENTENCES[:2]
+    reference = SentenceTransformer(model_name).encode(sentences)
+    candidate = embedding_backend.load_model(backend, model_name).encode(sentences, batch_size=3)
+    assert candidate.dtype == np.float32
+    assert embedding_backend.cosine_similarities(reference, candidate).min() >= COSINE_TOLERANCE[backend]
+
+
+def test_verify_backend_rejects_outputs_below_tolerance(model_name, onnx_dir, monkeypatch):
+    monkeypatch.setattr(embedding_backend, "ONNX_DIR", onnx_dir)
+    path = embedding_backend.ensure_onnx_model(False, model_name)
+    monkeypatch.setitem(COSINE_TOLERANCE, "onnx", 1.0 + 1e-6)
+    with pytest.raises(RuntimeError):
+        embedding_backend.verify_backend("onnx", path, model_name)
+    # 超出容差的模型被删除，下次使用时重新导出
+    assert not os.path.exists(path)
@@ -0,0 +1,55 @@
+import numpy as np
+
+import embedding_cache
+from conftest import DIMENSION
+from embedding_cache import CachedEncoder, EmbeddingCache, text_key
+
+
+class RecordingModel:
+    """记录传给模型的文本，向量由conftest中的FakeModel生成"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        self.calls.append(list(sentences))
+        return self.model.encode(sentences, **kwargs)
+
+    def get_sentence_embedding_dimension(self):
+        return DIMENSION
+
+
+def test_miss_encodes_original_text(tmp_path, fake_model):
+    model = RecordingModel(fake_model)
+    encoder = CachedEncoder(model, "test-model", directory=str(tmp_path))
+
+    original = "ＢＹＤ  秦Plus\tDM-i"
+    vector = encoder.encode(original)
+    assert model.calls == [[original]]
+    np.testing.assert_array_equal(vector, fake_model.encode(original))
+
+    # 规范化后相同的文本命中同一条缓存，不再调用模型
+    again = encoder.encode(["BYD 秦Plus DM-i", original])
+    assert model.calls == [[original]]
+    np.testing.assert_array_equal(again[0], vector)
+    np.testing.assert_array_equal(again[1], vector)
+
+
+def test_hits_batch_last_used_updates(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_TOUCH_BATCH", 3)
+    cache = EmbeddingCache("test-model", DIMENSION, directory=str(tmp_path))
+    keys = [text_key(f"第{i}条") for i in range(3)]
+    cache.put_many(keys, np.ones((3, DIMENSION), dtype=np.float32))
+
+    # 命中不足一批时不写索引
+    changes = cache._conn.total_changes
+    assert len(cache.get_many(keys[:2])) == 2
+    assert len(cache.get_many(keys[:1])) == 1
+    assert cache._conn.total_changes == changes
+
+    # 攒够一批后一次写入
+    assert len(cache.get_many(keys[2:])) == 1
+    assert cache._conn.total_changes == changes + 3
+    assert cache.stats()["hits"] == 4
+    cache.close()
@@ -0,0 +1,142 @@
+import pytest
+from qdrant_client import QdrantClient
+
+import import_data
+import json_to_qdrant
+from collection_profile import collection_config
+from conftest import DIMENSION
+from import_manifest import ImportManifest, content_id
+from import_pipeline import ImportPipeline, document_items
+from json_stream import JsonStreamReader
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_jsonl_invalid_line_raises_with_line_number(tmp_path):
+    path = write(tmp_path, "data.jsonl", '{"text": "一"}\n{"text": "二"}\n{"text": "三"\n{"text": "四"}\n')
+    documents = import_data.load_data_from_jsonl(path)
+    assert next(documents)["text"] == "一"
+    assert next(documents)["text"] == "二"
+    with pytest.raises(ValueError, match="第 3 行"):
+        next(documents)
+
+
+def test_csv_parse_error_raises(tmp_path):
+    pytest.importorskip("pandas")
+    path = write(tmp_path, "data.csv", "text,category\n一,a\n二,b,多余的列\n")
+    with pytest.raises(ValueError):
+        list(import_data.load_data_from_csv(path))
+
+
+def test_csv_without_text_column_raises(tmp_path):
+    pytest.importorskip("pandas")
+    path = write(tmp_path, "data.csv", "title,category\n一,a\n")
+    with pytest.raises(ValueError, match="text"):
+        import_data.load_data_from_csv(path)
+
+
+def test_text_loader_raises_on_invalid_encoding(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes("第一行\n".encode("utf-8") + b"\xff\xfe\n")
+    with pytest.raises(UnicodeDecodeError):
+        list(import_data.load_data_from_text(str(path)))
+
+
+def test_truncated_json_raises_with_offset(tmp_path):
+    content = "[" + ",".join(f'{{"name": "第{i}条"}}' for i in range(100)) + ',{"name": "截'
+    documents = json_to_qdrant.load_data_from_json(write(tmp_path, "data.json", content))
+    offset = content.rindex('"截')
+    with pytest.raises(ValueError, match=f"字符偏移 {offset}"):
+        for _ in documents:
+            pass
+
+
+def test_stream_reader_offset_is_absolute(tmp_path):
+    content = '[1, 2, 3, 4, 5, 6, 7, 8, 9 10]'
+    with open(write(tmp_path, "data.json", content), encoding="utf-8") as f:
+        reader = JsonStreamReader(f, chunk_size=7)
+        with pytest.raises(ValueError, match=f"字符偏移 {content.index('10]')}"):
+            list(reader.iter_array())
+
+
+def test_reader_error_propagates_out_of_pipeline(tmp_path, fake_model):
+    lines = "".join(f'{{"text": "第{i}条"}}\n' for i in range(300)) + "{截断"
+    documents = import_data.load_data_from_jsonl(write(tmp_path, "data.jsonl", lines))
+    client = QdrantClient(":memory:")
+    client.create_collection(collection_name="knowledge_base", **collection_config(DIMENSION))
+    pipeline = ImportPipeline(fake_model, client, "knowledge_base", encode_batch_size=16)
+    with pytest.raises(ValueError, match="第 301 行"):
+        pipeline.run(document_items(documents))
+    client.close()
+
+
+def test_json_main_exits_non_zero_on_parse_error(tmp_path, monkeypatch, capsys):
+    path = write(tmp_path, "data.json", '[{"name": "一"}, {"name": ')
+
+    def consume(documents, *args, **kwargs):
+        return sum(1 for _ in documents)
+
+    monkeypatch.setattr(json_to_qdrant, "import_to_qdrant", consume)
+    monkeypatch.setattr("sys.argv", ["json_to_qdrant.py", "--file", path, "--prune"])
+    with pytest.raises(SystemExit) as exc:
+        json_to_qdrant.main()
+    assert exc.value.code == 1
+    out = capsys.readouterr().out
+    assert "字符偏移" in out
+    assert "成功加载" not in out
+
+
+def test_main_exits_non_zero_on_parse_error(tmp_path, monkeypatch, capsys):
+    path = write(tmp_path, "data.jsonl", '{"text": "一"}\n不是JSON\n')
+
+    def consume(documents, *args, **kwargs):
+        for _ in documents:
+            pass
+        print("成功导入")
+
+    monkeypatch.setattr(import_data, "import_to_qdrant", consume)
+    monkeypatch.setattr("sys.argv", ["import_data.py", "--file", path, "--file_type", "jsonl", "--prune"])
+    with pytest.raises(SystemExit) as exc:
+        import_data.main()
+    assert exc.value.code == 1
+    out = capsys.readouterr().out
+    assert "第 2 行" in out
+    assert "成功导入" not in out
+
+
+def import_jsonl(client, manifest, path, model):
+    pipeline = ImportPipeline(model, client, "knowledge_base", encode_batch_size=16, id_fn=content_id, manifest=manifest)
+    return pipeline.run(document_items(import_data.load_data_from_jsonl(path)))
+
+
+def test_prune_refused_after_truncated_input(tmp_path, fake_model):
+    client = QdrantClient(":memory:")
+    client.create_collection(collection_name="knowledge_base", **collection_config(DIMENSION))
+    lines = [f'{{"text": "第{i}条"}}\n' for i in range(300)]
+    full = write(tmp_path, "full.jsonl", "".join(lines))
+    truncated = write(tmp_path, "truncated.jsonl", "".join(lines[:50]) + '{"text": "第50')
+
+    manifest = ImportManifest("knowledge_base", directory=str(tmp_path / "manifests"))
+    assert import_jsonl(client, manifest, full, fake_model) == 300
+    manifest.close()
+
+    # 第二次导入读到第51行时出错，清单没有标记为完整，prune不删除任何文档
+    manifest = ImportManifest("knowledge_base", directory=str(tmp_path / "manifests"))
+    with pytest.raises(ValueError):
+        import_jsonl(client, manifest, truncated, fake_model)
+    with pytest.raises(RuntimeError):
+        manifest.prune(client, "knowledge_base")
+    assert client.count("knowledge_base").count == 300
+    manifest.close()
+
+    # 完整读取的输入可以prune
+    manifest = ImportManifest("knowledge_base", directory=str(tmp_path / "manifests"))
+    import_jsonl(client, manifest, write(tmp_path, "part.jsonl", "".join(lines[:100])), fake_model)
+    assert manifest.prune(client, "knowledge_base") == 200
+    assert client.count("knowledge_base").count == 100
+    manifest.close()
+    client.close()
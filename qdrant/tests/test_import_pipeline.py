@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import import_pipeline
+from import_pipeline import AdaptiveBatchSize, ImportPipeline, PointBatch
+
+
+class FakeClient:
+    """记录每次upsert的点数和wait参数；前 failures 次 wait=False 的上传抛出 error"""
+
+    def __init__(self, failures=0, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.attempts = 0
+        self.calls = []
+
+    def upsert(self, collection_name, points, wait):
+        if not wait:
+            self.attempts += 1
+            if self.failures:
+                self.failures -= 1
+                raise self.error("上传失败")
+        self.calls.append((len(points.ids), wait))
+
+    @property
+    def sent(self):
+        return [count for count, wait in self.calls if not wait]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # 退避时间乘以0，重试不等待
+    monkeypatch.setattr(import_pipeline.random, "uniform", lambda a, b: 0.0)
+
+
+def items(count):
+    return ((f"第{i}条", {"i": i}) for i in range(count))
+
+
+def run(client, fake_model, count, **kwargs):
+    pipeline = ImportPipeline(fake_model, client, "test", encode_batch_size=64, upsert_concurrency=1, **kwargs)
+    return pipeline, pipeline.run(items(count))
+
+
+def point_batch(count, payload_bytes=0):
+    return PointBatch(
+        [str(i) for i in range(count)], np.zeros((count, 4), dtype=np.float32),
+        [{"text": "x" * payload_bytes} for _ in range(count)]
+    )
+
+
+def test_batch_size_grows_when_fast_and_shrinks_when_slow():
+    sizer = AdaptiveBatchSize(initial=100, minimum=8, maximum=200, target_seconds=1.0)
+    sizer.observe(100, 0.1)
+    assert sizer.size == 151
+    sizer.observe(151, 0.1)
+    assert sizer.size == 200
+    # 不满一批的上传不调整
+    sizer.observe(50, 5.0)
+    assert sizer.size == 200
+    sizer.observe(200, 4.0)
+    assert sizer.size == 50
+    # 在目标附近保持不变
+    sizer.observe(50, 0.8)
+    assert sizer.size == 50
+    sizer.observe(50, 1000.0)
+    assert sizer.size == 8
+
+
+def test_failed_halves_down_to_minimum():
+    sizer = AdaptiveBatchSize(initial=40, minimum=8)
+    sizer.failed()
+    assert sizer.size == 20
+    sizer.failed()
+    sizer.failed()
+    assert sizer.size == 8
+
+
+def test_take_respects_count_and_byte_limits():
+    sizer = AdaptiveBatchSize(initial=50, max_bytes=10 ** 9)
+    buffer = [point_batch(30), point_batch(30)]
+    assert len(sizer.take(buffer)) == 50
+    assert [len(batch) for batch in buffer] == [10]
+
+    sizer = AdaptiveBatchSize(initial=50, max_bytes=5000)
+    buffer = [point_batch(30, payload_bytes=1000)]
+    batch = sizer.take(buffer)
+    assert 0 < len(batch) < 50 and int(batch.sizes.sum()) <= 5000
+
+    # 单个点超过字节上限时仍然单独发送
+    sizer = AdaptiveBatchSize(initial=50, max_bytes=10)
+    buffer = [point_batch(3)]
+    assert len(sizer.take(buffer)) == 1
+
+
+def test_fast_uploads_grow_batches_and_end_with_barrier(fake_model):
+    client = FakeClient()
+    pipeline, count = run(client, fake_model, 2000, upsert_batch_size=100)
+    assert count == 2000
+    assert client.sent[:4] == [100, 151, 227, 341]
+    assert sum(client.sent) == 2000
+    # 最后一次是 wait=True 的单点屏障写入
+    assert client.calls[-1] == (1, True)
+    assert [wait for _, wait in client.calls].count(True) == 1
+
+
+def test_transient_error_is_retried_and_shrinks_batches(fake_model):
+    client = FakeClient(failures=1)
+    pipeline, count = run(client, fake_model, 500, upsert_batch_size=100)
+    assert count == 500
+    assert pipeline.retries == 1
+    assert client.attempts == len(client.sent) + 1
+    assert client.sent[:2] == [100, 50]
+
+
+def test_retries_exhausted_raises_without_barrier(fake_model):
+    client = FakeClient(failures=100)
+    with pytest.raises(ConnectionError):
+        run(client, fake_model, 50, max_retries=2)
+    assert client.attempts == 3
+    assert client.calls == []
+
+
+def test_non_transient_error_is_not_retried(fake_model):
+    client = FakeClient(failures=1, error=ValueError)
+    with pytest.raises(ValueError):
+        run(client, fake_model, 50)
+    assert client.attempts == 1
+    assert client.calls == []
@@ -0,0 +1,74 @@
+import pytest
+
+from payload_index import auto_index, parse_fields, plan_indexes, profile_payloads
+
+
+def infer(values):
+    return profile_payloads({"field": value} for value in values)["field"].infer()
+
+
+@pytest.mark.parametrize("values, kind", [
+    (["BYD", "Tesla", "BYD"], "keyword"),
+    ([["EV", "PHEV"], ["EV"]], "keyword"),
+    ([2021, 2022, 2023], "integer"),
+    ([1, 2.5, 3], "float"),
+    ([True, False], "bool"),
+    ([1, "a"], None),
+    ([True, 1], None),
+    ([{"a": 1}, {"a": 2}], None),
+    ([None, None], None),
+    (["这是一段比较长的描述文字" * 10], None),
+    (["a long free text description"], None),
+])
+def test_type_inference(values, kind):
+    assert infer(values) == kind
+
+
+def test_nulls_are_ignored():
+    assert infer([None, 2020, None]) == "integer"
+
+
+def test_unique_strings_are_ids_only_with_enough_samples():
+    unique = [f"id-{i}" for i in range(200)]
+    assert infer(unique) is None
+    # 样本太少时不按基数判断
+    assert infer(unique[:50]) == "keyword"
+    # 重复较多的字段仍然建索引
+    assert infer([f"brand-{i % 10}" for i in range(200)]) == "keyword"
+
+
+def test_chunk_fields_excluded_on_small_samples():
+    payloads = [
+        {"text": "正文", "parent_id": f"p{i // 3}", "chunk_index": i % 3, "chunk_count": 3, "brand": "BYD"}
+        for i in range(30)
+    ]
+    assert plan_indexes(payloads) == {"brand": "keyword"}
+
+
+def test_include_exclude_and_auto():
+    payloads = [{"brand": "BYD", "year": 2024, "note": "x"}] * 5
+    assert plan_indexes(payloads, exclude={"note"}) == {"brand": "keyword", "year": "integer"}
+    assert plan_indexes(payloads, include={"year": None, "missing": None}, auto=False) == {"year": "integer", "missing": "keyword"}
+    assert plan_indexes(payloads, include={"year": "float"}, exclude={"brand", "note"}) == {"year": "float"}
+
+
+def test_parse_fields():
+    assert parse_fields(" brand, year:Integer ,") == {"brand": None, "year": "integer"}
+    with pytest.raises(ValueError):
+        parse_fields("brand:text")
+
+
+def test_auto_index_returns_full_input():
+    created = []
+
+    class Client:
+        def get_collection(self, name):
+            return type("Info", (), {"payload_schema": {"year": None}})()
+
+        def create_payload_index(self, collection_name, field_name, field_schema, wait):
+            created.append((field_name, field_schema.value))
+
+    items = [(f"t{i}", {"brand": "BYD", "year": 2000 + i}) for i in range(20)]
+    assert list(auto_index(Client(), "kb", iter(items), sample_size=5)) == items
+    # 已存在的索引跳过
+    assert created == [("brand", "keyword")]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import query_cache
+from query_cache import LRUCache, normalize_text
+
+
+def vector(n):
+    # 4字节 * n
+    return np.zeros(n, dtype=np.float32)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_least_recently_used_over_byte_cap():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", vector(10))
+    cache.put("b", vector(10))
+    assert cache.get("a") is not None
+    # 超过100字节时淘汰最久未使用的 b
+    cache.put("c", vector(10))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 80
+    assert cache.stats()["evictions"] == 1
+
+
+def test_value_larger_than_cap_is_not_cached():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", vector(10))
+    cache.put("big", vector(26))
+    assert cache.get("big") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 0
+
+
+def test_overwrite_replaces_size():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", vector(20))
+    cache.put("a", vector(5))
+    assert cache.stats()["bytes"] == 20
+    assert len(cache.get("a")) == 5
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(max_bytes=100, ttl_seconds=30)
+    cache.put("a", vector(1))
+    clock.now += 29
+    assert cache.get("a") is not None
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = LRUCache(max_bytes=100, ttl_seconds=0)
+    cache.put("a", vector(1))
+    clock.now += 10 ** 9
+    assert cache.get("a") is not None
+
+
+def test_normalize_text():
+    assert normalize_text(" ＢＹＤ\t秦Plus \n DM-i ") == "BYD 秦Plus DM-i"
@@ -0,0 +1,42 @@
+import pytest
+from qdrant_client import QdrantClient
+
+import qdrant_kb
+import search_qdrant
+from collection_profile import collection_config
+from conftest import DIMENSION
+from import_pipeline import ImportPipeline
+
+DOCUMENTS = [
+    {"title": f"文档{i}", "content": f"第{i}篇文档的内容", "category": "测试"}
+    for i in range(20)
+]
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    yield client
+    client.close()
+
+
+def test_kb_search_uses_query_points(client, fake_model, monkeypatch):
+    # 与 qdrant_kb.py import 相同的集合结构(稠密向量 + BM25稀疏向量)
+    monkeypatch.setattr(qdrant_kb, "VECTOR_SIZE", DIMENSION)
+    qdrant_kb.create_collection_if_not_exists(client)
+    qdrant_kb.import_documents([dict(doc) for doc in DOCUMENTS], fake_model, client, auto_indexes=False)
+
+    results = qdrant_kb.search_knowledge_base("文档7 第7篇文档的内容", fake_model, client, limit=3)
+    assert len(results) == 3
+    assert results[0].payload["title"] == "文档7"
+    assert results[0].score == pytest.approx(1.0, abs=1e-4)
+
+
+def test_search_qdrant_uses_query_points(client, fake_model):
+    client.create_collection(collection_name="knowledge_base", **collection_config(DIMENSION))
+    texts = [doc["content"] for doc in DOCUMENTS]
+    ImportPipeline(fake_model, client, "knowledge_base").run((text, {"text": text}) for text in texts)
+
+    results = search_qdrant.search_qdrant(client, fake_model, texts[4], limit=5)
+    assert len(results) == 5
+    assert results[0].payload["text"] == texts[4]
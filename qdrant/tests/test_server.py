@@ -0,0 +1,148 @@
+import gc
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+from qdrant_client import AsyncQdrantClient
+
+import server
+
+
+def test_production_prepares_collection_before_fork(monkeypatch, fake_model):
+    base = pytest.importorskip("gunicorn.app.base")
+    events = []
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            events.append(("client", kwargs["prefer_grpc"]))
+
+        async def close(self):
+            events.append("close")
+
+    async def setup_collection(qdrant):
+        events.append("setup")
+
+    def run(app):
+        events.append(("run", app.cfg.worker_class_str))
+
+    monkeypatch.setattr(server, "model", fake_model)
+    monkeypatch.setattr(server, "AsyncQdrantClient", FakeClient)
+    monkeypatch.setattr(server, "setup_collection", setup_collection)
+    monkeypatch.setattr(base.BaseApplication, "run", run)
+    try:
+        server.run_production("127.0.0.1", 8000, 4)
+    finally:
+        gc.unfreeze()
+    # 主进程用REST客户端建好集合之后才启动工作进程
+    assert events == [("client", False), "setup", "close", ("run", "uvicorn_worker.UvicornWorker")]
+
+
+def test_setup_collection_is_idempotent(monkeypatch, fake_model):
+    monkeypatch.setattr(server, "model", fake_model)
+
+    async def setup_twice():
+        qdrant = AsyncQdrantClient(":memory:")
+        try:
+            await server.setup_collection(qdrant)
+            await server.setup_collection(qdrant)
+            return await qdrant.get_collection(server.COLLECTION_NAME)
+        finally:
+            await qdrant.close()
+
+    info = asyncio.run(setup_twice())
+    assert info.config.params.vectors.size == fake_model.get_sentence_embedding_dimension()
+
+
+def store(api, texts):
+    for text in texts:
+        assert api.post("/qdrant-store", json={"information": text}).status_code == 200
+
+
+def test_score_threshold_uses_dense_cosine(api):
+    assert server.use_hybrid()
+    store(api, [f"文档 {i}" for i in range(10)])
+
+    # 混合检索返回RRF排名分数，结果数只受limit限制
+    hybrid = api.post("/qdrant-find", json={"query": "文档 7", "limit": 5}).json()["results"]
+    assert len(hybrid) == 5
+
+    results = api.post("/qdrant-find", json={"query": "文档 7", "limit": 5, "score_threshold": 0.9999}).json()["results"]
+    assert [hit["content"] for hit in results] == ["文档 7"]
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_embed_query_encodes_original_text(api, monkeypatch, fake_model):
+    encoded = []
+    encode = server.batcher.encode
+
+    async def record(text):
+        encoded.append(text)
+        return await encode(text)
+
+    monkeypatch.setattr(server.batcher, "encode", record)
+    original = "ＢＹＤ  秦Plus\tDM-i"
+    vector = api.portal.call(server.embed_query, original)
+    assert encoded == [original]
+    assert vector == pytest.approx(fake_model.encode(original))
+
+    # 规范化后相同的查询命中内存缓存
+    api.portal.call(server.embed_query, "BYD 秦Plus DM-i")
+    assert encoded == [original]
+
+
+def test_result_cache_invalidated_by_writes(api):
+    store(api, ["文档 1", "文档 2"])
+    query = {"query": "文档 3", "limit": 10}
+    assert len(api.post("/qdrant-find", json=query).json()["results"]) == 2
+    assert server.result_cache.stats()["entries"] == 1
+
+    # 写入后版本号递增，旧结果不再命中
+    version = server.collection_version()
+    store(api, ["文档 3"])
+    assert server.collection_version() == version + 1
+    results = api.post("/qdrant-find", json=query).json()["results"]
+    assert results[0]["content"] == "文档 3" and len(results) == 3
+
+
+def test_result_cache_misses_after_version_bumped_elsewhere(api):
+    store(api, ["文档 1"])
+    query = {"query": "文档 1"}
+    api.post("/qdrant-find", json=query)
+    hits = server.result_cache.hits
+    api.post("/qdrant-find", json=query)
+    assert server.result_cache.hits == hits + 1
+
+    # 其他工作进程写入时只递增共享版本号，不清空本进程的缓存
+    with server.shared_collection_version.get_lock():
+        server.shared_collection_version.value += 1
+    api.post("/qdrant-find", json=query)
+    assert server.result_cache.hits == hits + 1
+
+
+@pytest.mark.parametrize("filters", [
+    {"price": 1.5},
+    {"brand": {"eq": "BYD"}},
+    {"brand": None},
+    {"powertrain": ["EV", 1]},
+    {"flags": [True, False]},
+])
+def test_invalid_filter_values_rejected(api, filters):
+    response = api.post("/qdrant-find", json={"query": "文档", "filters": filters})
+    assert response.status_code == 422
+    batch = api.post("/qdrant-find-batch", json={"queries": [{"query": "文档", "filters": filters}]})
+    assert batch.status_code == 422
+
+
+def test_valid_filter_values(api):
+    for i in range(4):
+        assert api.post("/qdrant-store", json={"information": f"文档 {i}", "metadata": {"i": i, "even": i % 2 == 0, "tag": f"t{i}"}}).status_code == 200
+    for filters, expected in [
+        ({"i": 2}, [2]),
+        ({"even": True}, [0, 2]),
+        ({"tag": ["t1", "t3"]}, [1, 3]),
+        ({"i": [0, 3]}, [0, 3]),
+    ]:
+        response = api.post("/qdrant-find", json={"query": "文档", "filters": filters, "limit": 10})
+        assert response.status_code == 200
+        assert sorted(hit["metadata"]["i"] for hit in response.json()["results"]) == expected
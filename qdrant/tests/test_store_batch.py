@@ -0,0 +1,96 @@
+import json
+import asyncio
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("fastapi")
+import server
+
+
+def ndjson(count):
+    return "".join(
+        json.dumps({"information": f"文档 {i}", "metadata": {"i": i}}, ensure_ascii=False) + "\n"
+        for i in range(count)
+    ).encode("utf-8")
+
+
+def read_acks(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def stored_points(api):
+    return api.portal.call(server.client.count, server.COLLECTION_NAME).count
+
+
+def test_store_batch_stores_every_line(api):
+    acks = read_acks(api.post("/qdrant-store-batch", content=ndjson(2000)))
+    assert acks[-1] == {"status": "done", "chunks": 8, "stored": 2000, "failed": 0}
+    assert sum(ack["count"] for ack in acks[:-1]) == 2000
+    assert stored_points(api) == 2000
+
+
+def test_store_batch_streamed_body(api):
+    body = ndjson(2000)
+
+    def chunks():
+        # 分块边界落在行中间
+        for start in range(0, len(body), 1000):
+            yield body[start:start + 1000]
+
+    acks = read_acks(api.post("/qdrant-store-batch", content=chunks()))
+    assert acks[-1]["stored"] == 2000
+    assert stored_points(api) == 2000
+
+
+def test_store_batch_reports_invalid_lines(api):
+    body = ndjson(3) + b"not json\n\n" + b'{"metadata": {}}\n' + ndjson(2)
+    acks = read_acks(api.post("/qdrant-store-batch", content=body))
+    assert acks[-1] == {"status": "done", "chunks": 1, "stored": 5, "failed": 2}
+    assert [error["line"] for error in acks[0]["errors"]] == [4, 6]
+
+
+def test_iter_ndjson_long_line_across_chunks():
+    line = json.dumps({"information": "x" * 100000}).encode("utf-8")
+
+    async def chunks():
+        for start in range(0, len(line), 7):
+            yield line[start:start + 7]
+        yield b"\n" + ndjson(1)
+
+    async def parse():
+        return [item async for item in server.iter_ndjson(chunks())]
+
+    parsed = asyncio.run(parse())
+    assert [line_no for line_no, _ in parsed] == [1, 2]
+    assert parsed[0][1].information == "x" * 100000
+    assert parsed[1][1].information == "文档 0"
+
+
+def test_collection_version_shared_with_forked_workers():
+    # 生产模式的工作进程由预加载了本模块的主进程fork而来
+    context = multiprocessing.get_context("fork")
+    before = server.collection_version()
+    worker = context.Process(target=server.bump_collection_version)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert server.collection_version() == before + 1
+
+
+def test_find_batch_returns_results_in_request_order(api):
+    read_acks(api.post("/qdrant-store-batch", content=ndjson(50)))
+    queries = [{"query": f"文档 {i}", "limit": 3, "filters": {"i": i}} for i in (7, 3, 41)]
+    response = api.post("/qdrant-find-batch", json={"queries": queries})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [[hit["metadata"]["i"] for hit in hits] for hits in results] == [[7], [3], [41]]
+    # 第二次请求由结果缓存返回
+    assert api.post("/qdrant-find-batch", json={"queries": queries}).json() == {"results": results}
+
+
+@pytest.mark.parametrize("count", [0, 65])
+def test_find_batch_rejects_query_count_out_of_range(api, count):
+    response = api.post("/qdrant-find-batch", json={"queries": [{"query": "文档"}] * count})
+    assert response.status_code == 422
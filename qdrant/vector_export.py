@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+向量导出文件(Parquet)
+导入脚本的 --export 模式把编码结果写入列式Parquet文件，不连接Qdrant；
+bulk_load.py 再把这些文件流式加载到任意Qdrant集合，加载时不需要模型。
+
+列:
+  id              点ID(字符串，整数ID加载时还原为整数)
+  vector          稠密向量 fixed_size_list<float32>[维度]
+  payload         payload的JSON
+  sparse_indices  BM25稀疏向量的词项编号 (可选)
+  sparse_values   BM25稀疏向量的权重 (可选)
+
+文件元数据记录向量维度、命名向量名称、模型与后端，加载时据此创建集合。
+需要 pyarrow。
+"""
+
+import os
+import json
+
+import numpy as np
+from qdrant_client.http.models import SparseVector
+
+from import_pipeline import PointBatch
+
+# 每个行组的点数，写入时凑满再落盘
+ROW_GROUP_SIZE = 8192
+
+META_PREFIX = b"qdrant."
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("导出/加载向量文件需要安装 pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def export_schema(dimension, with_sparse=False, metadata=None):
+    pa = _pyarrow()
+    fields = [
+        pa.field("id", pa.string(), nullable=False),
+        pa.field("vector", pa.list_(pa.float32(), dimension), nullable=False),
+        pa.field("payload", pa.string()),
+    ]
+    if with_sparse:
+        fields.append(pa.field("sparse_indices", pa.list_(pa.uint32())))
+        fields.append(pa.field("sparse_values", pa.list_(pa.float32())))
+    return pa.schema(fields, metadata={META_PREFIX + k.encode(): str(v).encode() for k, v in (metadata or {}).items()})
+
+
+class ParquetExporter:
+    """
+    将流水线的点批次写入Parquet文件，可以作为 ImportPipeline 的 client 传入。
+    先写入临时文件，close() 时再重命名，中途失败不会留下不完整的导出文件。
+    """
+
+    def __init__(self, path, dimension, vector_name=None, with_sparse=False,
+                 model_name=None, backend=None, row_group_size=ROW_GROUP_SIZE, extra_metadata=None):
+        pa = _pyarrow()
+        self.path = path
+        self.dimension = dimension
+        self.with_sparse = with_sparse
+        self.row_group_size = row_group_size
+        metadata = {"dimension": dimension, "vector_name": vector_name or "", "sparse": int(with_sparse)}
+        if model_name:
+            metadata["model"] = model_name
+        if backend:
+            metadata["backend"] = backend
+        # 其他字符串元数据，如快照中的集合配置
+        metadata.update(extra_metadata or {})
+        self.schema = export_schema(dimension, with_sparse, metadata)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._tmp_path = path + ".tmp"
+        self._writer = pa.parquet.ParquetWriter(self._tmp_path, self.schema, compression="zstd")
+        self._pending = []
+        self._pending_rows = 0
+        self.rows = 0
+
+    def write_batch(self, batch):
+        """追加一个 PointBatch"""
+        pa = _pyarrow()
+        vectors = np.ascontiguousarray(batch.vectors, dtype=np.float32)
+        columns = [
+            pa.array([str(point_id) for point_id in batch.ids], pa.string()),
+            # 连续的float32数组直接包装为定长列表，不逐个转换
+            pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), self.dimension),
+            pa.array([json.dumps(payload, ensure_ascii=False, default=str) for payload in batch.payloads], pa.string()),
+        ]
+        if self.with_sparse:
+            sparse = batch.sparse or [None] * len(batch)
+            columns.append(pa.array([vector.indices if vector else [] for vector in sparse], pa.list_(pa.uint32())))
+            columns.append(pa.array([vector.values if vector else [] for vector in sparse], pa.list_(pa.float32())))
+        self._pending.append(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        self._pending_rows += len(batch)
+        self.rows += len(batch)
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(_pyarrow().Table.from_batches(self._pending, schema=self.schema))
+            self._pending = []
+            self._pending_rows = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def export_files(path):
+    """path 为单个文件或包含 .parquet 文件的目录"""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith(".parquet")
+        )
+    return [path]
+
+
+def read_export_metadata(path):
+    """读取导出文件的元数据: dimension, vector_name, sparse, model, backend"""
+    pa = _pyarrow()
+    raw = pa.parquet.read_schema(path).metadata or {}
+    metadata = {
+        key[len(META_PREFIX):].decode(): value.decode()
+        for key, value in raw.items() if key.startswith(META_PREFIX)
+    }
+    if "dimension" not in metadata:
+        raise ValueError(f"{path} 不是向量导出文件")
+    metadata["dimension"] = int(metadata["dimension"])
+    metadata["vector_name"] = metadata.get("vector_name") or None
+    metadata["sparse"] = metadata.get("sparse") == "1"
+    return metadata
+
+
+def _restore_id(value):
+    return int(value) if value.isdigit() else value
+
+
+def iter_point_batches(files, batch_size=1024, with_sparse=True):
+    """流式读取导出文件，逐批产出 PointBatch；with_sparse=False 时忽略稀疏向量"""
+    pa = _pyarrow()
+
+    for path in files:
+        parquet_file = pa.parquet.ParquetFile(path)
+        has_sparse = "sparse_indices" in parquet_file.schema_arrow.names
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            vector_column = record_batch.column("vector")
+            dimension = vector_column.type.list_size
+            vectors = vector_column.flatten().to_numpy().reshape(-1, dimension)
+            sparse = None
+            if with_sparse and has_sparse:
+                sparse = [
+                    SparseVector(indices=indices, values=values)
+                    for indices, values in zip(
+                        record_batch.column("sparse_indices").to_pylist(),
+                        record_batch.column("sparse_values").to_pylist()
+                    )
+                ]
+            yield PointBatch(
+                [_restore_id(value) for value in record_batch.column("id").to_pylist()],
+                vectors,
+                [json.loads(value) if value else {} for value in record_batch.column("payload").to_pylist()],
+                sparse
+            )